@@ -0,0 +1,77 @@
+from bisect import bisect_left, insort
+from threading import RLock
+
+from api.cache import TITLE_NAMES, bump_generation, get_generation
+from reviews.models import Title
+
+
+class TitleNameIndex:
+    """Отсортированный в памяти процесса список названий произведений.
+
+    Записи этого процесса применяются к индексу сразу. Записи других
+    процессов и пакетные вставки увеличивают поколение TITLE_NAMES в общем
+    кеше, и индекс перечитывается из базы при следующем поиске.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.generation = None
+        self.keys = []
+        self.names = {}
+
+    @staticmethod
+    def normalize(name):
+        return name.strip().casefold()
+
+    def ensure_loaded(self):
+        generation = get_generation(TITLE_NAMES)
+        if generation == self.generation:
+            return
+        with self.lock:
+            self.names = dict(Title.objects.values_list('id', 'name'))
+            self.keys = sorted(
+                (self.normalize(name), title_id)
+                for title_id, name in self.names.items()
+            )
+            self.generation = generation
+
+    def search(self, query, limit):
+        """Первые по алфавиту произведения, название которых начинается
+        с query: список пар (id, название)."""
+        prefix = self.normalize(query)
+        if not prefix:
+            return []
+        self.ensure_loaded()
+        with self.lock:
+            result = []
+            position = bisect_left(self.keys, (prefix,))
+            for key, title_id in self.keys[position:position + limit]:
+                if not key.startswith(prefix):
+                    break
+                result.append((title_id, self.names[title_id]))
+            return result
+
+    def update(self, title_id, name=None):
+        """Заменяет или удаляет (name=None) название после фиксации записи."""
+        with self.lock:
+            if (self.generation == get_generation(TITLE_NAMES)
+                    and self.names.get(title_id) == name):
+                return
+            generation = bump_generation(TITLE_NAMES)
+            if (self.generation is None
+                    or generation != self.generation + 1):
+                # Между чтением индекса и этой записью поколение увеличил
+                # другой процесс: индекс перечитается при следующем поиске
+                self.generation = None
+                return
+            old_name = self.names.pop(title_id, None)
+            if old_name is not None:
+                old_key = (self.normalize(old_name), title_id)
+                del self.keys[bisect_left(self.keys, old_key)]
+            if name is not None:
+                self.names[title_id] = name
+                insort(self.keys, (self.normalize(name), title_id))
+            self.generation = generation
+
+
+title_names = TitleNameIndex()
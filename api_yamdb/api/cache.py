@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Пространства поколений: списки произведений, справочники жанров и
+# категорий, отдельное произведение по id и названия для автодополнения
+TITLES_LIST = 'titles'
+CATALOG = 'catalog'
+TITLE = 'title:{}'
+TITLE_NAMES = 'title-names'
+
+GENERATION_KEY = 'generation:{}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_generation(namespace):
+    cache = get_cache()
+    key = GENERATION_KEY.format(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        # Начальное значение от текущего времени: после вытеснения ключа
+        # поколение не совпадёт с уже использованным в старых записях
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(*namespaces):
+    """Делает недействительными все записи с этими поколениями.
+
+    Возвращает новое поколение последнего из пространств имён.
+    """
+    cache = get_cache()
+    generation = None
+    for namespace in namespaces:
+        key = GENERATION_KEY.format(namespace)
+        try:
+            generation = cache.incr(key)
+        except ValueError:
+            generation = time.time_ns()
+            cache.set(key, generation, timeout=None)
+    return generation
+
+
+def invalidate(*namespaces):
+    """Увеличивает поколения после фиксации текущей транзакции.
+
+    Иначе параллельный запрос успел бы закешировать старые данные под
+    новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generation(*namespaces))
+
+
+def invalidate_titles(*title_ids):
+    invalidate(TITLES_LIST, *(TITLE.format(pk) for pk in title_ids))
+
+
+def make_key(prefix, namespaces, request):
+    """Ключ из адреса, поколений и нормализованных параметров запроса.
+
+    Адрес входит в ключ явно: значения поколений разных пространств
+    могут совпасть.
+    """
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    digest = hashlib.md5(
+        f'{request.build_absolute_uri(request.path)}:{params}'.encode()
+    ).hexdigest()
+    generations = ':'.join(
+        str(get_generation(namespace)) for namespace in namespaces
+    )
+    return f'{prefix}:{generations}:{digest}'
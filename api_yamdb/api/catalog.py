@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from api.cache import CATALOG, get_generation
+from reviews.models import Category, Genre
+
+
+class CatalogCache:
+    """Категории или жанры целиком в памяти процесса.
+
+    Таблицы маленькие и меняются редко: состояние перечитывается одним
+    запросом, когда меняется поколение CATALOG в общем кеше, то есть после
+    создания, изменения или удаления любой категории или жанра.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.state = None
+
+    def get_state(self, reload=False):
+        generation = get_generation(CATALOG)
+        state = self.state
+        if reload or state is None or state.generation != generation:
+            objects = list(self.model.objects.order_by('name', 'id'))
+            state = SimpleNamespace(
+                generation=generation,
+                objects=objects,
+                by_slug={obj.slug: obj for obj in objects},
+                last_modified=max(
+                    (obj.modified for obj in objects), default=None
+                )
+            )
+            # Состояние заменяется целиком, поэтому блокировка не нужна
+            self.state = state
+        return state
+
+    def find(self, slugs):
+        """Словарь {slug: объект} для найденных slug.
+
+        С кешем в памяти процесса поколение не видит записи других
+        процессов, поэтому отсутствующие slug проверяются в базе, и если
+        хотя бы один из них там есть, состояние перечитывается.
+        """
+        state = self.get_state()
+        missing = set(slugs) - state.by_slug.keys()
+        if missing and self.model.objects.filter(slug__in=missing).exists():
+            state = self.get_state(reload=True)
+        return {
+            slug: state.by_slug[slug] for slug in slugs
+            if slug in state.by_slug
+        }
+
+    def get(self, slug):
+        """Объект по slug или None."""
+        return self.find((slug,)).get(slug)
+
+    def ids(self, slugs):
+        """Словарь {slug: id} для найденных slug."""
+        return {slug: obj.id for slug, obj in self.find(slugs).items()}
+
+
+categories = CatalogCache(Category)
+genres = CatalogCache(Genre)
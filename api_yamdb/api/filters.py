@@ -1,12 +1,116 @@
 import django_filters
+from django.db.models import Subquery
+from rest_framework import filters
 
-from reviews.models import Title
+from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.search import search_titles
+
+
+def split_slugs(value):
+    return {slug.strip() for slug in value.split(',')} - {''}
+
+
+def with_genres(queryset, genres):
+    """Подзапрос IN по таблице связей с индексом (genre_id, title_id)."""
+    return queryset.filter(pk__in=Title.genre.through.objects.filter(
+        genre_id__in=genres.values('id')
+    ).values('title_id'))
 
 
 class TitleFilter(django_filters.FilterSet):
-    genre = django_filters.CharFilter(field_name='genre__slug')
-    category = django_filters.CharFilter(field_name='category__slug')
+    """Фильтры произведений.
+
+    Жанры и категории передаются списком slug через запятую: `genre` -
+    любой из жанров, `genre_all` - все жанры сразу. Фильтры по связям
+    строятся подзапросами, поэтому строки произведений не дублируются.
+    `year_min` и `year_max` задают диапазон лет включительно.
+    """
+
+    genre = django_filters.CharFilter(method='filter_genre')
+    genre_all = django_filters.CharFilter(method='filter_genre_all')
+    category = django_filters.CharFilter(method='filter_category')
+    year_min = django_filters.NumberFilter(
+        field_name='year', lookup_expr='gte'
+    )
+    year_max = django_filters.NumberFilter(
+        field_name='year', lookup_expr='lte'
+    )
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Title
-        fields = ('name', 'year', 'category', 'genre')
+        fields = (
+            'name', 'year', 'year_min', 'year_max', 'category', 'genre',
+            'genre_all', 'search'
+        )
+
+    def filter_genre(self, queryset, name, value):
+        slugs = split_slugs(value)
+        if not slugs:
+            return queryset
+        return with_genres(queryset, Genre.objects.filter(slug__in=slugs))
+
+    def filter_genre_all(self, queryset, name, value):
+        for slug in split_slugs(value):
+            queryset = with_genres(queryset, Genre.objects.filter(slug=slug))
+        return queryset
+
+    def filter_category(self, queryset, name, value):
+        slugs = split_slugs(value)
+        if not slugs:
+            return queryset
+        categories = Category.objects.filter(slug__in=slugs).values('id')
+        if len(slugs) == 1:
+            # Равенство, а не IN: индекс (category_id, name, id) тогда
+            # отдаёт строки уже в порядке сортировки
+            return queryset.filter(category_id=Subquery(categories[:1]))
+        return queryset.filter(category_id__in=categories)
+
+    def filter_search(self, queryset, name, value):
+        return search_titles(queryset, value)
+
+
+class TitleOrderingFilter(filters.OrderingFilter):
+    """Сортировка по одному полю из `ordering_fields` с добавлением id.
+
+    Для каждого разрешённого поля есть составной индекс (поле, id),
+    поэтому сортировка выполняется по индексу, а id делает её устойчивой.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        field = ordering[0]
+        return field, '-id' if field.startswith('-') else 'id'
+
+
+class ExportFilter(django_filters.FilterSet):
+    """Фильтры выгрузки отзывов и комментариев.
+
+    `title` - id произведения, `author` - username автора, `since` и
+    `until` - диапазон даты публикации: `since` включительно, `until` нет.
+    """
+
+    title = django_filters.NumberFilter(field_name='title_id')
+    author = django_filters.CharFilter(field_name='author__username')
+    since = django_filters.DateTimeFilter(
+        field_name='pub_date', lookup_expr='gte'
+    )
+    until = django_filters.DateTimeFilter(
+        field_name='pub_date', lookup_expr='lt'
+    )
+
+
+class ReviewExportFilter(ExportFilter):
+    class Meta:
+        model = Review
+        fields = ()
+
+
+class CommentExportFilter(ExportFilter):
+    title = django_filters.NumberFilter(field_name='review__title_id')
+
+    class Meta:
+        model = Comment
+        fields = ()
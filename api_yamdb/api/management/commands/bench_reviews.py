@@ -0,0 +1,98 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+from api.views import CommentViewSet, ReviewViewSet
+from reviews.models import Category, Comment, Review, Title
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время и число запросов первой и последней страницы '
+        'отзывов и комментариев при тысячах отзывов на произведение. '
+        'Данные создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=(1000, 5000),
+            help='Количество отзывов и комментариев'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество замеров, берётся лучший'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            authors = self.create_authors(max(options['sizes']))
+            category = Category.objects.create(
+                name='Бенчмарк', slug='bench'
+            )
+            self.stdout.write(
+                f'{"размер":>8} {"список":>12} {"страница":>9} '
+                f'{"запросов":>9} {"мс":>8}'
+            )
+            for size in options['sizes']:
+                self.bench(size, authors[:size], category, options['repeat'])
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_authors(count):
+        User.objects.bulk_create(
+            User(username=f'bench{idx}', email=f'bench{idx}@yamdb.fake')
+            for idx in range(count)
+        )
+        return list(User.objects.filter(
+            username__startswith='bench'
+        ).values_list('id', flat=True))
+
+    def bench(self, size, authors, category, repeat_count):
+        title = Title.objects.create(
+            name=f'Произведение {size}', year=2000, category=category
+        )
+        Review.objects.bulk_create(
+            Review(title=title, author_id=author_id, text='Отзыв', score=5)
+            for author_id in authors
+        )
+        review = Review.objects.filter(title=title).first()
+        Comment.objects.bulk_create(
+            Comment(review=review, author_id=author_id, text='Комментарий')
+            for author_id in authors
+        )
+        last_page = -(-size // api_settings.PAGE_SIZE)
+        for name, view, kwargs in (
+            ('отзывы', ReviewViewSet, {'title_id': str(title.id)}),
+            ('комментарии', CommentViewSet, {
+                'title_id': str(title.id), 'review_id': str(review.id)
+            }),
+        ):
+            for page in (1, last_page):
+                queries, elapsed = self.measure(
+                    view, kwargs, page, repeat_count
+                )
+                self.stdout.write(
+                    f'{size:>8} {name:>12} {page:>9} {queries:>9} '
+                    f'{elapsed:>8.1f}'
+                )
+
+    @staticmethod
+    def measure(view, kwargs, page, repeat_count):
+        list_view = view.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/', {'page': page})
+        timings = []
+        for _ in range(repeat_count):
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                response = list_view(request, **kwargs)
+                timings.append((perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.data
+        return len(context.captured_queries), min(timings)
@@ -0,0 +1,88 @@
+from timeit import repeat
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.serializers import TitleReadFastSerializer, TitleReadSerializer
+from reviews.models import Category, Genre, Title
+
+
+GENRES_PER_TITLE = 3
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает TitleReadSerializer и TitleReadFastSerializer на '
+        'страницах разного размера. Данные создаются во временной '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=(20, 100, 500),
+            help='Размеры страниц'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество замеров, берётся лучший'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_titles(max(options['sizes']))
+            self.stdout.write(
+                f'{"размер":>8} {"DRF, мс":>10} {"быстрый, мс":>12} '
+                f'{"ускорение":>10}'
+            )
+            for size in options['sizes']:
+                self.bench(size, options['repeat'])
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_titles(count):
+        category = Category.objects.create(name='Бенчмарк', slug='bench')
+        Genre.objects.bulk_create(
+            Genre(name=f'Жанр {idx}', slug=f'bench-{idx}')
+            for idx in range(GENRES_PER_TITLE)
+        )
+        genres = Genre.objects.filter(slug__startswith='bench-')
+        Title.objects.bulk_create(
+            Title(
+                name=f'Произведение {idx}', year=2000, category=category,
+                description='Описание', rating=7.5
+            )
+            for idx in range(count)
+        )
+        titles = Title.objects.filter(category=category)
+        Title.genre.through.objects.bulk_create(
+            Title.genre.through(title_id=title_id, genre_id=genre.id)
+            for title_id in titles.values_list('id', flat=True)
+            for genre in genres
+        )
+
+    def bench(self, size, repeat_count):
+        titles = Title.objects.filter(category__slug='bench')[:size]
+
+        def drf():
+            return TitleReadSerializer(
+                titles.select_related('category').prefetch_related('genre'),
+                many=True
+            ).data
+
+        def fast():
+            return TitleReadFastSerializer(
+                TitleReadFastSerializer.get_values_queryset(titles),
+                many=True
+            ).data
+
+        assert [dict(title) for title in drf()] == fast(), (
+            'Быстрый сериализатор формирует другой ответ'
+        )
+        drf_time, fast_time = (
+            min(repeat(serialize, number=1, repeat=repeat_count)) * 1000
+            for serialize in (drf, fast)
+        )
+        self.stdout.write(
+            f'{size:>8} {drf_time:>10.1f} {fast_time:>12.1f} '
+            f'{drf_time / fast_time:>9.1f}x'
+        )
@@ -0,0 +1,238 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .cache import get_cache, make_key
+from reviews.deletion import schedule_deletion
+
+
+DELETION_SCHEDULED = 'Объект скрыт и будет удалён в фоновом режиме.'
+
+
+class ConditionalListMixin:
+    """Условные GET-запросы без сериализации ответа.
+
+    ETag считается одним агрегатом по отобранным объектам: дата
+    последнего изменения и количество, которое меняется при удалении.
+    Last-Modified не отправляется: удаление не меняет наибольшую дату
+    изменения, а точность заголовка - секунда.
+    """
+
+    def conditional_response(self, request, queryset, get_response):
+        state = self.get_validators_state(queryset)
+        return self.validated_response(
+            request, state['last_modified'], state['count'], get_response
+        )
+
+    @staticmethod
+    def get_validators_state(queryset):
+        return queryset.aggregate(
+            last_modified=Max('modified'), count=Count('pk')
+        )
+
+    def validated_response(self, request, last_modified, count,
+                           get_response):
+        etag = quote_etag(hashlib.md5(
+            f'{last_modified}:{count}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+        response = get_response()
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        def get_response():
+            return super(ConditionalListMixin, self).list(
+                request, *args, **kwargs
+            )
+
+        is_keyset = getattr(self.paginator, 'is_keyset', None)
+        if is_keyset is not None and is_keyset(request):
+            # Курсорная страница читается по индексу за постоянное время,
+            # а агрегат для валидаторов прошёл бы по всем строкам
+            return get_response()
+        return self.conditional_response(
+            request, self.filter_queryset(self.get_queryset()), get_response
+        )
+
+
+class ConditionalGetMixin(ConditionalListMixin):
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        # Как и get_object: некорректное значение из адреса - это 404
+        try:
+            state = self.get_validators_state(queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ))
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        return self.validated_response(
+            request, state['last_modified'], state['count'],
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+
+class CachedResponseMixin:
+    """Кеш ответов list и retrieve по параметрам запроса.
+
+    В ключ входят поколения cache_namespaces: запись в связанные модели
+    увеличивает поколение, и старые записи больше не читаются.
+    Кешируются данные ответа вместе с валидаторами, поэтому условный
+    запрос к закешированному ответу не обращается к базе.
+    """
+
+    cache_prefix = None
+    cache_namespaces = None
+
+    def get_cache_namespaces(self):
+        """Поколения ответа текущего действия; None - не кешировать."""
+        return self.cache_namespaces
+
+    def cached_response(self, request, get_response):
+        namespaces = self.get_cache_namespaces()
+        if namespaces is None:
+            return get_response()
+        cache = get_cache()
+        key = make_key(
+            f'{self.cache_prefix}:{self.action}', namespaces, request
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = get_response()
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    (response.data, response.get('ETag')),
+                    settings.RESPONSE_CACHE_TIMEOUT
+                )
+            return response
+        data, etag = cached
+        response = Response(data)
+        if etag:
+            response['ETag'] = etag
+        return get_conditional_response(
+            request, etag=etag, response=response
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+
+class SparseFieldsetsMixin:
+    """Параметр ?fields= со списком полей ответа через запятую.
+
+    Поля передаются сериализатору в контексте, а get_queryset может не
+    загружать данные для полей, которые не запрошены.
+    """
+
+    fields_query_param = 'fields'
+    # Поля модели, которые загружаются всегда, например ключ сортировки
+    always_loaded_fields = ('id',)
+
+    def get_requested_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',')} - {''}
+
+    def is_field_requested(self, name):
+        fields = self.get_requested_fields()
+        return fields is None or name in fields
+
+    def only_requested_fields(self, queryset):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        model_fields = {
+            field.name for field in queryset.model._meta.concrete_fields
+        }
+        return queryset.only(
+            *self.always_loaded_fields, *(fields & model_fields)
+        )
+
+    def select_requested_related(self, queryset, *names):
+        """select_related только для запрошенных полей-связей."""
+        names = [name for name in names if self.is_field_requested(name)]
+        return queryset.select_related(*names) if names else queryset
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'fields': self.get_requested_fields()
+        }
+
+
+class AsyncDestroyMixin:
+    """DELETE с параметром ?async=true: объект сразу скрывается, а он и
+    зависимые объекты удаляются командой purge_deleted."""
+
+    async_query_param = 'async'
+
+    def destroy(self, request, *args, **kwargs):
+        if request.query_params.get(self.async_query_param) not in (
+            'true', '1'
+        ):
+            return super().destroy(request, *args, **kwargs)
+        schedule_deletion(self.get_object())
+        return Response(
+            {'detail': DELETION_SCHEDULED}, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class NestedParentMixin:
+    """Проверка родителей вложенного адреса одним запросом.
+
+    Результат сохраняется в запросе, поэтому get_queryset, perform_create
+    и условный GET не повторяют поиск, а списки фильтруются по id родителя
+    без загрузки его строки.
+    """
+
+    parent_queryset = None
+    # Поле родителя: параметр адреса
+    parent_lookups = {}
+
+    def get_parent_ids(self):
+        """Словарь {параметр адреса: id} для существующей цепочки."""
+        parent_ids = getattr(self.request, 'parent_ids', None)
+        if parent_ids is None:
+            parent_ids = {
+                kwarg: int(self.kwargs[kwarg])
+                for kwarg in self.parent_lookups.values()
+            }
+            if not self.parent_queryset.filter(**{
+                field: parent_ids[kwarg]
+                for field, kwarg in self.parent_lookups.items()
+            }).exists():
+                raise Http404
+            self.request.parent_ids = parent_ids
+        return parent_ids
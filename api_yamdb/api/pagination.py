@@ -0,0 +1,291 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from reviews.models import Title
+
+
+INVALID_CURSOR = 'Некорректный курсор.'
+SEARCH_WITH_CURSOR = (
+    'Результаты поиска не поддерживают курсорную пагинацию.'
+)
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу сортировки без COUNT и OFFSET.
+
+    Последнее поле `ordering` должно быть уникальным. NULL допускается
+    только в первом поле и считается меньше любого значения.
+    """
+
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+        position, reverse = self.decode_cursor(request)
+        return self.paginate_from(queryset, position, reverse)
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def paginate_from(self, queryset, position, reverse):
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        page = []
+        for segment in keyset_segments(
+            ordering, position, nullable=self.fields[0].null
+        ):
+            page += queryset.filter(segment).order_by(*ordering)[
+                :self.page_size + 1 - len(page)
+            ]
+            if len(page) > self.page_size:
+                break
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        self.page = page
+        return page
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # Строка .values(): поля доступны по именам столбцов
+            instance = SimpleNamespace(**instance)
+        return [
+            None if field.value_from_object(instance) is None
+            else field.value_to_string(instance)
+            for field in self.fields
+        ]
+
+    def encode_cursor(self, position, reverse):
+        token = json.dumps({'p': position, 'r': reverse})
+        return urlsafe_b64encode(token.encode()).decode()
+
+    @classmethod
+    def get_cursor_query_params(cls):
+        """Параметры, наличие которых включает курсорный режим."""
+        return (cls.cursor_query_param,)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        return self.decode_token(token)
+
+    def decode_token(self, token):
+        try:
+            cursor = json.loads(urlsafe_b64decode(token.encode()))
+            if len(cursor['p']) != len(self.fields):
+                raise ValueError
+            position = [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, cursor['p'])
+            ]
+            return position, bool(cursor['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError,
+                DjangoValidationError):
+            raise NotFound(INVALID_CURSOR)
+
+    def get_link(self, instance, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.get_position(instance), reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+
+def keyset_filter(ordering, position):
+    """Условие «строго после позиции» для составного ключа сортировки."""
+    names = [name.lstrip('-') for name in ordering]
+    descending = [name.startswith('-') for name in ordering]
+    after = Q()
+    for index, name in enumerate(names):
+        lookup = 'lt' if descending[index] else 'gt'
+        step = Q(**{f'{name}__{lookup}': position[index]})
+        for prev_name, value in zip(names[:index], position):
+            step &= Q(**{prev_name: value})
+        after |= step
+    # Нестрогое условие по первому полю позволяет выбрать диапазон
+    # по индексу, а не проверять OR для каждой строки
+    lookup = 'lte' if descending[0] else 'gte'
+    return Q(**{f'{names[0]}__{lookup}': position[0]}) & after
+
+
+def keyset_segments(ordering, position, nullable=False):
+    """Условия частей выборки после позиции в порядке сортировки.
+
+    Если первое поле допускает NULL, строки с NULL и без него выбираются
+    отдельными запросами: в каждом первое поле либо всегда NULL, либо
+    нет, и запрос читает диапазон индекса (поле, id). NULL меньше любого
+    значения: при убывании эти строки идут последними, при возрастании -
+    первыми.
+    """
+    if not nullable:
+        return [Q() if position is None else keyset_filter(ordering, position)]
+    name = ordering[0].lstrip('-')
+    null = Q(**{f'{name}__isnull': True})
+    not_null = Q(**{f'{name}__isnull': False})
+    if ordering[0].startswith('-'):
+        if position is None:
+            return [not_null, null]
+        if position[0] is None:
+            return [null & keyset_filter(ordering[1:], position[1:])]
+        return [keyset_filter(ordering, position), null]
+    if position is None:
+        return [null, not_null]
+    if position[0] is None:
+        return [null & keyset_filter(ordering[1:], position[1:]), not_null]
+    return [keyset_filter(ordering, position)]
+
+
+class TitleKeysetPagination(KeysetPagination):
+    """Курсор по сортировке из фильтров представления, иначе по названию.
+
+    Поиск сортирует по релевантности, которой нет среди полей модели,
+    поэтому вместе с курсором он отклоняется.
+    """
+
+    ordering = (*Title._meta.ordering, 'id')
+    search_query_param = 'search'
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.search_query_param):
+            raise ValidationError(
+                {self.search_query_param: [SEARCH_WITH_CURSOR]}
+            )
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        return self.ordering
+
+
+class PubDateKeysetPagination(KeysetPagination):
+    """Курсоры before и after по дате публикации, от новых к старым.
+
+    `before` - элементы старее курсора, `after` - новее, например
+    появившиеся с прошлого запроса. Ссылка next ведёт к более старым,
+    previous - к более новым элементам.
+    """
+
+    ordering = ('-pub_date', '-id')
+    before_query_param = 'before'
+    after_query_param = 'after'
+
+    @classmethod
+    def get_cursor_query_params(cls):
+        return (
+            *super().get_cursor_query_params(),
+            cls.before_query_param,
+            cls.after_query_param
+        )
+
+    def decode_cursor(self, request):
+        for param, reverse in ((self.before_query_param, False),
+                               (self.after_query_param, True)):
+            token = request.query_params.get(param)
+            if token:
+                position, _ = self.decode_token(token)
+                return position, reverse
+        return super().decode_cursor(request)
+
+    def get_previous_link(self):
+        # Ссылка на более новые элементы есть всегда: по ней клиент
+        # запрашивает появившиеся позже, даже если новых пока нет
+        if not self.page:
+            if self.after_query_param in self.request.query_params:
+                return self.request.build_absolute_uri()
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_link(self, instance, reverse):
+        url = self.request.build_absolute_uri()
+        for param in ('page', *self.get_cursor_query_params()):
+            url = remove_query_param(url, param)
+        return replace_query_param(
+            url,
+            self.after_query_param if reverse else self.before_query_param,
+            self.encode_cursor(self.get_position(instance), reverse)
+        )
+
+
+class PageNumberOrKeysetPagination(BasePagination):
+    """Постраничная пагинация с переключением на курсорную.
+
+    Курсорный режим включается параметром `?pagination=cursor` или
+    наличием курсора в запросе.
+    """
+
+    mode_query_param = 'pagination'
+    keyset_mode = 'cursor'
+    keyset_class = KeysetPagination
+
+    def is_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param)
+            == self.keyset_mode
+            or any(
+                param in request.query_params
+                for param in self.keyset_class.get_cursor_query_params()
+            )
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = (
+            self.keyset_class() if self.is_keyset(request)
+            else PageNumberPagination()
+        )
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class TitlePagination(PageNumberOrKeysetPagination):
+    keyset_class = TitleKeysetPagination
+
+
+class PubDatePagination(PageNumberOrKeysetPagination):
+    keyset_class = PubDateKeysetPagination
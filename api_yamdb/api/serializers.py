@@ -1,18 +1,57 @@
+from operator import itemgetter
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 
+from .cache import TITLE_NAMES, TITLES_LIST, invalidate, invalidate_titles
+from .catalog import categories, genres
 from reviews.constants import (
     MAX_LENGTH_EMAIL, MAX_LENGTH_USERNAME
 )
 from reviews.models import (
     Review, Comment, Category, Genre, Title
 )
+from reviews.signals import recount_title_aggregates
 
 
 User = get_user_model()
 
-ONLY_ONE_REVIEW = 'Можно оставить только один отзыв на произведение'
+DUPLICATE_REVIEW = 'Отзыв этого автора на произведение уже есть в запросе.'
+
+
+class SparseFieldsMixin:
+    # Поля, которые выводятся, только если перечислены в ?fields=
+    optional_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Список полей передаёт SparseFieldsetsMixin представления
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        else:
+            for name in self.optional_fields:
+                self.fields.pop(name)
+
+
+class CatalogSlugRelatedField(serializers.SlugRelatedField):
+    """Поиск категории или жанра по slug в кеше процесса, а не в базе."""
+
+    def __init__(self, catalog, **kwargs):
+        self.catalog = catalog
+        super().__init__(
+            slug_field='slug', queryset=catalog.model.objects.all(), **kwargs
+        )
+
+    def to_internal_value(self, data):
+        obj = self.catalog.get(str(data))
+        if obj is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+        return obj
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -27,7 +66,32 @@ class GenreSerializer(serializers.ModelSerializer):
         fields = ('name', 'slug')
 
 
-class TitleReadSerializer(serializers.ModelSerializer):
+class TitlesCountMixin(SparseFieldsMixin, serializers.Serializer):
+    """Список справочника: ?fields= и необязательное поле titles_count.
+
+    Вложенные в произведение категория и жанр используют базовые
+    сериализаторы: ?fields= произведения к ним не относится.
+    """
+
+    optional_fields = ('titles_count',)
+    # Количества для страницы передаёт представление в контексте
+    titles_count = serializers.SerializerMethodField()
+
+    def get_titles_count(self, obj):
+        return self.context['titles_count'].get(obj.id, 0)
+
+
+class CategoryListSerializer(TitlesCountMixin, CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        fields = (*CategorySerializer.Meta.fields, 'titles_count')
+
+
+class GenreListSerializer(TitlesCountMixin, GenreSerializer):
+    class Meta(GenreSerializer.Meta):
+        fields = (*GenreSerializer.Meta.fields, 'titles_count')
+
+
+class TitleReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     rating = serializers.IntegerField(read_only=True)
     genre = GenreSerializer(many=True)
     category = CategorySerializer()
@@ -41,18 +105,183 @@ class TitleReadSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class TitleWriteSerializer(serializers.ModelSerializer):
-    genre = serializers.SlugRelatedField(
-        many=True,
-        slug_field='slug',
-        queryset=Genre.objects.all(),
-        allow_empty=False
+class TitleReadFastSerializer:
+    """Список произведений без механизма полей DRF.
+
+    Возвращает тот же JSON, что и TitleReadSerializer, но собирает словари
+    из строк .values() и жанров, выбранных одним запросом на страницу.
+    """
+
+    fields = TitleReadSerializer.Meta.fields
+    # Столбцы .values() для каждого поля ответа, жанры выбираются отдельно
+    columns = {
+        'id': ('id',),
+        'name': ('name',),
+        'year': ('year',),
+        'rating': ('rating',),
+        'description': ('description',),
+        'genre': (),
+        'category': ('category__name', 'category__slug'),
+    }
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.fields = self.get_fields((context or {}).get('fields'))
+
+    @classmethod
+    def get_fields(cls, requested=None):
+        if not requested:
+            return cls.fields
+        return tuple(name for name in cls.fields if name in requested)
+
+    @classmethod
+    def get_values_queryset(cls, queryset, requested=None):
+        # id нужен для жанров, а все поля сортировки - для курсора
+        # пагинации
+        columns = {'id', 'name', 'year', 'rating'}
+        for name in cls.get_fields(requested):
+            columns.update(cls.columns[name])
+        return queryset.values(*columns)
+
+    @staticmethod
+    def get_genres(rows):
+        genres = {}
+        for title_id, name, slug in Title.genre.through.objects.filter(
+            title_id__in=[row['id'] for row in rows]
+        ).order_by('genre__name').values_list(
+            'title_id', 'genre__name', 'genre__slug'
+        ):
+            genres.setdefault(title_id, []).append(
+                {'name': name, 'slug': slug}
+            )
+        return genres
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        genres = self.get_genres(rows) if 'genre' in self.fields else {}
+        getters = {
+            'genre': lambda row: genres.get(row['id'], []),
+            'category': lambda row: {
+                'name': row['category__name'], 'slug': row['category__slug']
+            },
+            'rating': lambda row: (
+                None if row['rating'] is None else int(row['rating'])
+            ),
+        }
+        getters = [
+            (name, getters.get(name, itemgetter(name)))
+            for name in self.fields
+        ]
+        data = [
+            {name: getter(row) for name, getter in getters} for row in rows
+        ]
+        return data if self.many else data[0]
+
+
+class TitleBulkListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            # Ошибку not_a_list возвращает ListSerializer
+            return super().to_internal_value(data)
+        # Все slug из запроса разрешаются по кешу справочников до проверки
+        # отдельных произведений
+        items = [item for item in data if isinstance(item, dict)]
+        genre_slugs = {
+            slug for item in items
+            if isinstance(item.get('genre'), list)
+            for slug in item['genre'] if isinstance(slug, str)
+        }
+        self.category_ids = categories.ids(
+            {str(item.get('category')) for item in items}
+        )
+        self.genre_ids = genres.ids(genre_slugs)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        titles = [
+            Title(
+                name=item['name'],
+                year=item['year'],
+                description=item.get('description', ''),
+                category_id=item['category']
+            )
+            for item in validated_data
+        ]
+        with transaction.atomic():
+            titles = Title.objects.bulk_create(titles)
+            if titles[0].pk is None:
+                # SQLite не возвращает id из bulk_create: транзакция держит
+                # блокировку записи, так что последние id — вставленные
+                ids = list(Title.all_objects.order_by('-id').values_list(
+                    'id', flat=True
+                )[:len(titles)])
+                ids.reverse()
+                if len(ids) != len(titles):
+                    raise RuntimeError(
+                        f'Ожидалось {len(titles)} новых id произведений, '
+                        f'найдено {len(ids)}.'
+                    )
+                for title, title_id in zip(titles, ids):
+                    title.id = title_id
+            Title.genre.through.objects.bulk_create(
+                Title.genre.through(title_id=title.id, genre_id=genre_id)
+                for title, item in zip(titles, validated_data)
+                for genre_id in item['genre']
+            )
+            # bulk_create не отправляет сигналы моделей
+            invalidate(TITLES_LIST, TITLE_NAMES)
+        return titles
+
+
+class TitleBulkWriteSerializer(serializers.ModelSerializer):
+    genre = serializers.ListField(
+        child=serializers.SlugField(), allow_empty=False
     )
-    category = serializers.SlugRelatedField(
-        slug_field='slug',
-        queryset=Category.objects.all()
+    category = serializers.SlugField()
+
+    class Meta:
+        model = Title
+        fields = ('name', 'year', 'description', 'genre', 'category')
+        list_serializer_class = TitleBulkListSerializer
+
+    @staticmethod
+    def resolve_slug(ids, slug):
+        if slug not in ids:
+            raise serializers.ValidationError(
+                serializers.SlugRelatedField.default_error_messages[
+                    'does_not_exist'
+                ].format(slug_name='slug', value=slug)
+            )
+        return ids[slug]
+
+    def validate_category(self, slug):
+        return self.resolve_slug(self.parent.category_ids, slug)
+
+    def validate_genre(self, slugs):
+        # Повторы убираются, как в .set(): связь произведения с жанром
+        # уникальна
+        return [
+            self.resolve_slug(self.parent.genre_ids, slug)
+            for slug in dict.fromkeys(slugs)
+        ]
+
+
+class TitleLeaderboardSerializer(TitleReadSerializer):
+    weighted_rating = serializers.FloatField(
+        source='leaderboard.weighted_rating'
     )
 
+    class Meta(TitleReadSerializer.Meta):
+        fields = (*TitleReadSerializer.Meta.fields, 'weighted_rating')
+        read_only_fields = fields
+
+
+class TitleWriteSerializer(serializers.ModelSerializer):
+    genre = CatalogSlugRelatedField(genres, many=True, allow_empty=False)
+    category = CatalogSlugRelatedField(categories)
+
     class Meta:
         model = Title
         fields = (
@@ -64,25 +293,15 @@ class TitleWriteSerializer(serializers.ModelSerializer):
         return TitleReadSerializer(instance).data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
-    author = serializers.SlugRelatedField(read_only=True,
-                                          slug_field='username')
-
-    class Meta:
-        model = Review
-        fields = ('id', 'text', 'author', 'score', 'pub_date',)
-
-    def validate(self, data):
-        if not self.context.get('request').method == 'POST':
-            return data
-        user = self.context['request'].user
-        title_id = self.context['view'].kwargs['title_id']
-        if Review.objects.filter(author=user, title=title_id).exists():
-            raise serializers.ValidationError(ONLY_ONE_REVIEW)
-        return data
+class ScoreHistogramSerializer(serializers.Serializer):
+    scores = serializers.DictField(
+        source='distribution', child=serializers.IntegerField()
+    )
+    count = serializers.IntegerField()
+    mean = serializers.FloatField(allow_null=True)
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         read_only=True, slug_field='username')
 
@@ -91,6 +310,140 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = 'id', 'author', 'text', 'pub_date'
 
 
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(read_only=True,
+                                          slug_field='username')
+    latest_comment = serializers.SerializerMethodField()
+    optional_fields = ('latest_comment',)
+
+    class Meta:
+        model = Review
+        fields = (
+            'id', 'text', 'author', 'score', 'pub_date', 'comments_count',
+            'latest_comment'
+        )
+        read_only_fields = ('comments_count',)
+
+    def get_latest_comment(self, review):
+        # Последние комментарии страницы выбирает представление
+        comment = self.context['latest_comments'].get(review.id)
+        return None if comment is None else CommentSerializer(comment).data
+
+
+class ReviewImportListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        # Произведения и авторы всего пакета проверяются двумя запросами,
+        # а не отдельно для каждого отзыва
+        items = [item for item in data if isinstance(item, dict)]
+        title_ids = set()
+        for item in items:
+            try:
+                title_ids.add(int(item.get('title')))
+            except (TypeError, ValueError):
+                pass
+        self.title_ids = set(Title.objects.filter(
+            pk__in=title_ids
+        ).values_list('id', flat=True))
+        self.author_ids = dict(User.objects.filter(
+            username__in={str(item.get('author')) for item in items}
+        ).values_list('username', 'id'))
+        self.seen = set()
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def find_reviews(pairs):
+        """Отзывы с парами (author_id, title_id) из pairs."""
+        return [
+            review for review in Review.objects.filter(
+                title_id__in={title_id for _, title_id in pairs},
+                author_id__in={author_id for author_id, _ in pairs}
+            ).only('id', 'author_id', 'title_id')
+            if (review.author_id, review.title_id) in pairs
+        ]
+
+    def create(self, validated_data):
+        """Вставляет новые отзывы, существующие пропускает или обновляет.
+
+        Возвращает количество созданных, обновлённых и пропущенных.
+        """
+        reviews = {
+            (item['author'], item['title']): item for item in validated_data
+        }
+        with transaction.atomic():
+            existing = self.find_reviews(reviews)
+            for review in existing:
+                item = reviews.pop((review.author_id, review.title_id))
+                review.text = item['text']
+                review.score = item['score']
+                review.modified = timezone.now()
+            # Отзыв, добавленный параллельно после проверки, пропускается
+            # по ограничению one_review_per_title, поэтому созданные
+            # считаются по отзывам, появившимся во время вставки
+            found = len(self.find_reviews(reviews)) if reviews else 0
+            Review.objects.bulk_create(
+                (
+                    Review(
+                        author_id=author_id, title_id=title_id,
+                        text=item['text'], score=item['score']
+                    )
+                    for (author_id, title_id), item in reviews.items()
+                ),
+                ignore_conflicts=True
+            )
+            created = len(self.find_reviews(reviews)) - found if reviews else 0
+            updated = existing if self.context.get('update') else []
+            Review.objects.bulk_update(updated, ('text', 'score', 'modified'))
+            # bulk_create и bulk_update не отправляют сигналы моделей
+            title_ids = {
+                title_id for _, title_id in reviews
+            } | {review.title_id for review in updated}
+            if title_ids:
+                recount_title_aggregates(title_ids)
+                invalidate_titles(*title_ids)
+        return {
+            'created': created,
+            'updated': len(updated),
+            'skipped': len(existing) + len(reviews) - created - len(updated)
+        }
+
+
+class ReviewImportSerializer(serializers.ModelSerializer):
+    title = serializers.IntegerField()
+    author = serializers.CharField()
+
+    class Meta:
+        model = Review
+        fields = ('title', 'author', 'text', 'score')
+        list_serializer_class = ReviewImportListSerializer
+
+    def validate_title(self, title_id):
+        if title_id not in self.parent.title_ids:
+            raise serializers.ValidationError(
+                serializers.PrimaryKeyRelatedField.default_error_messages[
+                    'does_not_exist'
+                ].format(pk_value=title_id)
+            )
+        return title_id
+
+    def validate_author(self, username):
+        if username not in self.parent.author_ids:
+            raise serializers.ValidationError(
+                serializers.SlugRelatedField.default_error_messages[
+                    'does_not_exist'
+                ].format(slug_name='username', value=username)
+            )
+        return self.parent.author_ids[username]
+
+    def validate(self, attrs):
+        key = (attrs['author'], attrs['title'])
+        if key in self.parent.seen:
+            raise serializers.ValidationError(DUPLICATE_REVIEW)
+        self.parent.seen.add(key)
+        return attrs
+
+
 class ValidateUsernameMixin:
     def validate_username(self, value):
         for validator in User._meta.get_field('username').validators:
@@ -116,7 +469,9 @@ class UserSignupSerializer(serializers.Serializer, ValidateUsernameMixin):
     email = serializers.EmailField(max_length=MAX_LENGTH_EMAIL, required=True)
 
 
-class UserSerializer(serializers.ModelSerializer, ValidateUsernameMixin):
+class UserSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer, ValidateUsernameMixin
+):
     class Meta:
         model = User
         fields = (
@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from api.autocomplete import title_names
+from api.cache import (
+    CATALOG, TITLE_NAMES, TITLES_LIST, bump_generation, invalidate,
+    invalidate_titles
+)
+from reviews.models import Category, Genre, Review, Title
+from reviews.signals import deletion_scheduled
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+def invalidate_title(sender, instance, **kwargs):
+    invalidate_titles(instance.pk)
+
+
+@receiver(post_save, sender=Title)
+def update_title_name(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    loaded_name = getattr(instance, '_loaded_name', None)
+    instance._loaded_name = instance.name
+    if not created and loaded_name == instance.name:
+        return
+    title_id, name = instance.pk, instance.name
+    transaction.on_commit(lambda: title_names.update(title_id, name))
+
+
+@receiver(post_delete, sender=Title)
+def remove_title_name(sender, instance, **kwargs):
+    title_id = instance.pk
+    transaction.on_commit(lambda: title_names.update(title_id))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def invalidate_title_genres(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Связи изменены со стороны жанра: затронуты многие произведения
+        invalidate(TITLES_LIST, CATALOG)
+    else:
+        invalidate_titles(instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    invalidate(TITLES_LIST, CATALOG)
+
+
+@receiver(pre_save, sender=Review)
+def invalidate_previous_review_title(sender, instance, **kwargs):
+    title_id, _ = getattr(instance, '_loaded_rating', (None, None))
+    if title_id is not None and title_id != instance.title_id:
+        invalidate_titles(title_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_title(sender, instance, **kwargs):
+    invalidate_titles(instance.title_id)
+
+
+@receiver(deletion_scheduled, sender=Category)
+def invalidate_hidden_category(sender, **kwargs):
+    invalidate(TITLES_LIST, CATALOG, TITLE_NAMES)
+
+
+@receiver(deletion_scheduled, sender=Title)
+def invalidate_hidden_title(sender, instance, **kwargs):
+    invalidate(TITLE_NAMES)
+    invalidate_titles(instance.pk)
+
+
+def reset_response_cache(sender, **kwargs):
+    # После migrate или flush в тестах база другая, а кеш прежний
+    bump_generation(TITLES_LIST, CATALOG, TITLE_NAMES)
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     CategoryViewSet, GenreViewSet, TitleViewSet, ReviewViewSet,
-    CommentViewSet, UsersView, signup_or_update, confirmation
+    CommentViewSet, UsersView, signup_or_update, confirmation, export_comments,
+    export_reviews, import_reviews
 )
 
 
@@ -27,5 +28,8 @@ auth_urls = [
 
 urlpatterns = [
     path('v1/auth/', include(auth_urls)),
+    path('v1/reviews/import/', import_reviews, name='reviews-import'),
+    path('v1/reviews/export/', export_reviews, name='reviews-export'),
+    path('v1/comments/export/', export_comments, name='comments-export'),
     path('v1/', include(v1_router.urls)),
 ]
@@ -1,30 +1,51 @@
+import json
 import random
+from datetime import datetime
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import IntegrityError
+from django.db.models import Count, OuterRef, Subquery
+from django.http import StreamingHttpResponse
 from rest_framework.exceptions import ValidationError
 from django.core.mail import send_mail
-from django.db.models import Avg
 from django_filters.rest_framework import DjangoFilterBackend
-from django.shortcuts import get_object_or_404
-from rest_framework import filters, mixins, viewsets, status
+from rest_framework import filters, mixins, serializers, viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 
+from .autocomplete import title_names
+from .cache import CATALOG, TITLE, TITLES_LIST
+from .catalog import categories, genres
+from .mixins import (
+    AsyncDestroyMixin, CachedResponseMixin, ConditionalGetMixin,
+    ConditionalListMixin, NestedParentMixin, SparseFieldsetsMixin
+)
+from .pagination import PubDatePagination, TitlePagination
 from .permissions import (
     IsAdminModeratorAuthorOrReadOnly, IsAdminOrReadOnly, IsAdmin
 )
-from .filters import TitleFilter
+from .filters import (
+    CommentExportFilter, ReviewExportFilter, TitleFilter, TitleOrderingFilter
+)
 from .serializers import (
-    ReviewSerializer, CommentSerializer, CategorySerializer, GenreSerializer,
-    TitleReadSerializer, TitleWriteSerializer, UserSerializer,
-    UserProfileSerializer, UserSignupSerializer, UserConfirmationSerializer
+    ReviewImportSerializer, ReviewSerializer, CommentSerializer,
+    CategoryListSerializer, CategorySerializer, GenreListSerializer,
+    GenreSerializer,
+    ScoreHistogramSerializer, TitleBulkWriteSerializer,
+    TitleLeaderboardSerializer, TitleReadFastSerializer, TitleReadSerializer,
+    TitleWriteSerializer, UserSerializer, UserProfileSerializer,
+    UserSignupSerializer, UserConfirmationSerializer
 )
 from reviews.constants import MESSAGE, SUBJECT
-from reviews.models import Title, Genre, Category, Review
+from reviews.models import (
+    Category, Comment, Genre, Review, ScoreHistogram, Title
+)
 
 
 User = get_user_model()
@@ -33,8 +54,17 @@ INVALID_CONFIRM_CODE = 'Неверный код подтверждения.'
 
 ALREADY_EXIST_FIELD = 'Этот {} уже занят.'
 
+ONLY_ONE_REVIEW = 'Можно оставить только один отзыв на произведение'
+
+# Что делать с отзывом, который автор уже оставил на произведение
+ON_CONFLICT_SKIP = 'skip'
+ON_CONFLICT_UPDATE = 'update'
+INVALID_ON_CONFLICT = 'Допустимые значения: {}.'
+
 
 class CategoryGenreBaseViewSet(
+    ConditionalListMixin,
+    SparseFieldsetsMixin,
     mixins.CreateModelMixin,
     mixins.DestroyModelMixin,
     mixins.ListModelMixin,
@@ -45,82 +75,281 @@ class CategoryGenreBaseViewSet(
     search_fields = 'name',
     pagination_class = PageNumberPagination
     lookup_field = 'slug'
+    catalog = None
+    # Поле произведения, по которому считаются произведения справочника
+    titles_count_field = None
+    list_serializer_class = None
+
+    def is_titles_count_requested(self):
+        return 'titles_count' in (self.get_requested_fields() or ())
+
+    def count_titles(self, objects):
+        """Количество произведений для страницы одним запросом с GROUP BY."""
+        field = self.titles_count_field
+        return dict(Title.objects.filter(
+            **{f'{field}__in': [obj.id for obj in objects]}
+        ).order_by().values_list(field).annotate(Count('pk')))
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return self.list_serializer_class
+        return super().get_serializer_class()
 
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.is_titles_count_requested():
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                'titles_count': self.count_titles(args[0])
+            }
+        return super().get_serializer(*args, **kwargs)
 
-class CategoryViewSet(CategoryGenreBaseViewSet):
+    def list(self, request, *args, **kwargs):
+        search = self.search_fields and request.query_params.get(
+            api_settings.SEARCH_PARAM
+        )
+        if search:
+            objects = self.filter_queryset(self.get_queryset())
+        else:
+            # Без поиска список отдаётся из кеша справочника без запросов
+            state = self.catalog.get_state()
+            objects = state.objects
+
+        def get_response():
+            return self.get_paginated_response(self.get_serializer(
+                self.paginate_queryset(objects), many=True
+            ).data)
+
+        if self.is_titles_count_requested():
+            # Количество произведений меняется без изменения справочника,
+            # поэтому валидаторы условного запроса к нему неприменимы
+            return get_response()
+        if search:
+            return self.conditional_response(request, objects, get_response)
+        return self.validated_response(
+            request, state.last_modified, len(state.objects), get_response
+        )
+
+
+class CategoryViewSet(AsyncDestroyMixin, CategoryGenreBaseViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    list_serializer_class = CategoryListSerializer
+    catalog = categories
+    titles_count_field = 'category'
 
 
 class GenreViewSet(CategoryGenreBaseViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    list_serializer_class = GenreListSerializer
+    catalog = genres
+    titles_count_field = 'genre'
 
 
-class TitleViewSet(viewsets.ModelViewSet):
-    queryset = Title.objects.all().annotate(
-        rating=Avg('reviews__score')).order_by(*Title._meta.ordering)
+class TitleViewSet(
+    AsyncDestroyMixin, CachedResponseMixin, ConditionalGetMixin,
+    SparseFieldsetsMixin, viewsets.ModelViewSet
+):
+    queryset = Title.objects.all()
     permission_classes = IsAdminOrReadOnly,
-    filter_backends = DjangoFilterBackend, filters.OrderingFilter
+    filter_backends = DjangoFilterBackend, TitleOrderingFilter
     filterset_class = TitleFilter
-    pagination_class = PageNumberPagination
+    ordering_fields = 'name', 'year', 'rating'
+    pagination_class = TitlePagination
     http_method_names = (
         'get', 'post', 'patch', 'delete', 'head', 'options', 'trace'
     )
+    always_loaded_fields = ('id', 'name')
+    cache_prefix = 'titles'
+    cache_namespaces = (TITLES_LIST,)
+
+    def get_cache_namespaces(self):
+        if self.action == 'list':
+            return super().get_cache_namespaces()
+        try:
+            # Поколение общее для любой записи id в адресе, например 07
+            title_id = int(self.kwargs['pk'])
+        except ValueError:
+            return None
+        return (CATALOG, TITLE.format(title_id))
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return TitleReadFastSerializer.get_values_queryset(
+                super().get_queryset(), self.get_requested_fields()
+            )
+        queryset = self.only_requested_fields(super().get_queryset())
+        if self.is_field_requested('category'):
+            queryset = queryset.select_related('category')
+        if self.is_field_requested('genre'):
+            queryset = queryset.prefetch_related('genre')
+        return queryset
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action == 'list':
+            return TitleReadFastSerializer
+        if self.action == 'retrieve':
             return TitleReadSerializer
         return TitleWriteSerializer
 
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        # Пакетное создание: ошибки возвращаются списком по позициям,
+        # а при успехе все произведения вставляются одной транзакцией
+        serializer = TitleBulkWriteSerializer(
+            data=request.data, many=True, allow_empty=False
+        )
+        serializer.is_valid(raise_exception=True)
+        titles = serializer.save()
+        return Response(
+            TitleReadSerializer(
+                self.get_queryset().filter(
+                    pk__in=[title.pk for title in titles]
+                ).order_by('id'),
+                many=True
+            ).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=('get',))
+    def stats(self, request, pk=None):
+        title = get_object_or_404(
+            Title.objects.select_related('histogram').only('id'), pk=pk
+        )
+        histogram = getattr(title, 'histogram', None) or ScoreHistogram()
+        return Response(ScoreHistogramSerializer(histogram).data)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=('get',))
+    def top(self, request):
+        # Рейтинг заранее рассчитан командой refresh_leaderboard,
+        # здесь только фильтрация и сортировка по индексу
+        queryset = DjangoFilterBackend().filter_queryset(
+            request,
+            Title.objects.filter(leaderboard__isnull=False).select_related(
+                'category', 'leaderboard'
+            ).prefetch_related('genre'),
+            self
+        ).order_by('-leaderboard__weighted_rating', 'id')
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(
+            TitleLeaderboardSerializer(page, many=True).data
+        )
+
+    @action(detail=False, methods=('get',))
+    def autocomplete(self, request):
+        # Индекс названий в памяти процесса, база не используется
+        try:
+            limit = min(
+                int(request.query_params['limit']),
+                settings.AUTOCOMPLETE_MAX_LIMIT
+            )
+        except (KeyError, ValueError):
+            limit = settings.AUTOCOMPLETE_LIMIT
+        return Response([
+            {'id': title_id, 'name': name}
+            for title_id, name in title_names.search(
+                request.query_params.get('q', ''), max(limit, 1)
+            )
+        ])
+
+
+class ReviewViewSet(
+    NestedParentMixin, ConditionalGetMixin, SparseFieldsetsMixin,
+    viewsets.ModelViewSet
+):
     serializer_class = ReviewSerializer
     permission_classes = (IsAdminModeratorAuthorOrReadOnly,)
     http_method_names = (
         'get', 'post', 'patch', 'delete', 'head', 'options', 'trace'
     )
-    pagination_class = PageNumberPagination
-
-    def get_title(self):
-        return get_object_or_404(Title, pk=self.kwargs['title_id'])
+    pagination_class = PubDatePagination
+    # Ключ курсорной пагинации загружается при любом ?fields=
+    always_loaded_fields = ('id', 'pub_date')
+    parent_queryset = Title.objects.all()
+    parent_lookups = {'pk': 'title_id'}
 
     def get_queryset(self):
-        return self.get_title().reviews.all()
+        # Автор выводится по username и загружается тем же запросом
+        return self.select_requested_related(self.only_requested_fields(
+            Review.objects.filter(title_id=self.get_parent_ids()['title_id'])
+        ), 'author')
+
+    @staticmethod
+    def get_latest_comments(reviews):
+        """Последние комментарии отзывов страницы одним запросом."""
+        latest = Comment.objects.filter(
+            review_id=OuterRef('pk')
+        ).order_by('-pub_date', '-id').values('id')[:1]
+        return {
+            comment.review_id: comment
+            for comment in Comment.objects.filter(
+                id__in=Review.objects.filter(
+                    id__in=[review.id for review in reviews]
+                ).annotate(latest=Subquery(latest)).values('latest')
+            ).select_related('author')
+        }
+
+    def get_serializer(self, *args, **kwargs):
+        if args and 'latest_comment' in (self.get_requested_fields() or ()):
+            reviews = args[0] if kwargs.get('many') else [args[0]]
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                'latest_comments': self.get_latest_comments(reviews)
+            }
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(
-            author=self.request.user,
-            title=self.get_title()
-        )
+        title_id = self.get_parent_ids()['title_id']
+        # Повторный отзыв отсекает ограничение one_review_per_title, без
+        # предварительной проверки. Review.save выполняется в atomic, поэтому
+        # после ошибки транзакция остаётся рабочей.
+        try:
+            serializer.save(author=self.request.user, title_id=title_id)
+        except IntegrityError:
+            if not Review.objects.filter(
+                author=self.request.user, title_id=title_id
+            ).exists():
+                raise
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [ONLY_ONE_REVIEW]}
+            )
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(
+    NestedParentMixin, ConditionalGetMixin, SparseFieldsetsMixin,
+    viewsets.ModelViewSet
+):
     serializer_class = CommentSerializer
     permission_classes = (IsAdminModeratorAuthorOrReadOnly,)
     http_method_names = (
         'get', 'post', 'patch', 'delete', 'head', 'options', 'trace'
     )
-    pagination_class = PageNumberPagination
-
-    def get_review(self):
-        return get_object_or_404(
-            Review,
-            pk=self.kwargs['review_id'],
-            title__id=self.kwargs['title_id']
-        )
+    pagination_class = PubDatePagination
+    # Ключ курсорной пагинации загружается при любом ?fields=
+    always_loaded_fields = ('id', 'pub_date')
+    # Отзыв скрытого произведения тоже недоступен
+    parent_queryset = Review.objects.filter(title__pending_deletion=False)
+    parent_lookups = {'pk': 'review_id', 'title_id': 'title_id'}
 
     def get_queryset(self):
-        return self.get_review().comments.all()
+        return self.select_requested_related(self.only_requested_fields(
+            Comment.objects.filter(
+                review_id=self.get_parent_ids()['review_id']
+            )
+        ), 'author')
 
     def perform_create(self, serializer):
         serializer.save(
             author=self.request.user,
-            review=self.get_review()
+            review_id=self.get_parent_ids()['review_id']
         )
 
 
-class UsersView(viewsets.ModelViewSet):
+class UsersView(
+    AsyncDestroyMixin, SparseFieldsetsMixin, viewsets.ModelViewSet
+):
     serializer_class = UserSerializer
     queryset = User.objects.all()
     http_method_names = (
@@ -132,6 +361,9 @@ class UsersView(viewsets.ModelViewSet):
     permission_classes = IsAdmin,
     pagination_class = PageNumberPagination
 
+    def get_queryset(self):
+        return self.only_requested_fields(super().get_queryset())
+
     @action(
         detail=False,
         methods=['get', 'patch'],
@@ -141,7 +373,9 @@ class UsersView(viewsets.ModelViewSet):
     def user_profile(self, request):
         if request.method == 'GET':
             return Response(
-                UserSerializer(request.user).data,
+                UserSerializer(
+                    request.user, context=self.get_serializer_context()
+                ).data,
                 status=status.HTTP_200_OK
             )
         serializer = UserProfileSerializer(
@@ -161,14 +395,16 @@ def signup_or_update(request):
     try:
         user, _ = User.objects.get_or_create(**data)
     except IntegrityError:
-        if User.objects.filter(username=data['username']).exists():
+        # Занятыми считаются и имена пользователей, ожидающих удаления
+        if User.all_objects.filter(username=data['username']).exists():
             raise ValidationError(
                 {'username': ALREADY_EXIST_FIELD.format('username')}
             )
-        elif User.objects.filter(email=data['email']).exists():
+        elif User.all_objects.filter(email=data['email']).exists():
             raise ValidationError(
                 {'email': ALREADY_EXIST_FIELD.format('email')}
             )
+        raise
     # Генерируем код подтверждения и сохраняем пользователю
     confirmation_code = ''.join(random.choices(
         settings.VALID_CHARS_CODE,
@@ -192,7 +428,7 @@ def confirmation(request):
     serializer = UserConfirmationSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     data = serializer.validated_data
-    user = get_object_or_404(User, username=data['username'])
+    user = get_object_or_404(User.objects, username=data['username'])
     # Проверяем генерировался ли код для пользователя
     if user.confirmation_code == settings.RESERVED_CODE:
         raise ValidationError({'confirmation_code': INVALID_CONFIRM_CODE})
@@ -207,3 +443,88 @@ def confirmation(request):
     return Response(
         {'token': str(AccessToken.for_user(user))}, status=status.HTTP_200_OK
     )
+
+
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def import_reviews(request):
+    """Пакетная загрузка отзывов на разные произведения."""
+    on_conflict = request.query_params.get('on_conflict', ON_CONFLICT_SKIP)
+    if on_conflict not in (ON_CONFLICT_SKIP, ON_CONFLICT_UPDATE):
+        raise ValidationError({'on_conflict': INVALID_ON_CONFLICT.format(
+            ', '.join((ON_CONFLICT_SKIP, ON_CONFLICT_UPDATE))
+        )})
+    serializer = ReviewImportSerializer(
+        data=request.data, many=True, allow_empty=False,
+        context={'update': on_conflict == ON_CONFLICT_UPDATE}
+    )
+    serializer.is_valid(raise_exception=True)
+    return Response(serializer.save(), status=status.HTTP_200_OK)
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """Даты в том же виде, что в ответах API: с микросекундами.
+
+    DjangoJSONEncoder оставляет миллисекунды, и выгрузка, продолженная
+    с даты последней строки, повторяла бы строки.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return serializers.DateTimeField().to_representation(o)
+        return super().default(o)
+
+
+def export_response(request, queryset, filterset_class, fields):
+    """Потоковая выгрузка строк в формате NDJSON: объект JSON на строку.
+
+    `fields` - {ключ в выгрузке: поле запроса}. Строки читаются из базы
+    частями по EXPORT_CHUNK_SIZE и сразу отправляются клиенту.
+    """
+    filterset = filterset_class(request.query_params, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    rows = filterset.qs.order_by('id').values_list(
+        *fields.values()
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    return StreamingHttpResponse(
+        (
+            json.dumps(
+                dict(zip(fields, row)),
+                cls=ExportJSONEncoder,
+                ensure_ascii=False
+            ) + '\n'
+            for row in rows
+        ),
+        content_type='application/x-ndjson'
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def export_reviews(request):
+    return export_response(
+        request,
+        Review.objects.filter(title__pending_deletion=False),
+        ReviewExportFilter,
+        {
+            'id': 'id', 'title': 'title_id', 'author': 'author__username',
+            'text': 'text', 'score': 'score', 'pub_date': 'pub_date',
+            'comments_count': 'comments_count'
+        }
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def export_comments(request):
+    return export_response(
+        request,
+        Comment.objects.filter(review__title__pending_deletion=False),
+        CommentExportFilter,
+        {
+            'id': 'id', 'title': 'review__title_id', 'review': 'review_id',
+            'author': 'author__username', 'text': 'text',
+            'pub_date': 'pub_date'
+        }
+    )
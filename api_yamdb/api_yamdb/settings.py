@@ -139,3 +139,31 @@ USERNAME_RESERVED = 'me'
 VALID_CHARS_CODE = '0123456789'
 LENGTH_CODE = 6
 RESERVED_CODE = 'z' * LENGTH_CODE
+
+
+# Минимальное число отзывов, с которым средняя оценка произведения
+# весит в рейтинге лучших столько же, сколько средняя по всем произведениям
+LEADERBOARD_MIN_REVIEWS = 10
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Кеш ответов списка и карточки произведения. Поколения хранятся в том же
+# кеше, поэтому при нескольких процессах нужен общий бэкенд, например
+# django.core.cache.backends.filebased.FileBasedCache
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Количество подсказок автодополнения по умолчанию и наибольшее
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Сколько объектов команда purge_deleted удаляет одной транзакцией
+PURGE_BATCH_SIZE = 500
+
+# Сколько строк выгрузка отзывов и комментариев читает из базы за раз
+EXPORT_CHUNK_SIZE = 2000
@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
     verbose_name = 'Произведения'
+
+    def ready(self):
+        from reviews import signals
+        post_migrate.connect(signals.ensure_search_index, sender=self)
@@ -0,0 +1,54 @@
+from django.db import transaction
+
+from reviews.models import Category, Comment, Review, Title
+from reviews.signals import deletion_scheduled
+
+
+def schedule_deletion(instance):
+    """Скрывает объект сразу, удаляет его команда purge_deleted.
+
+    Произведения категории скрываются вместе с ней одним UPDATE.
+    """
+    model = type(instance)
+    with transaction.atomic():
+        model.all_objects.filter(pk=instance.pk).update(pending_deletion=True)
+        if model is Category:
+            Title.all_objects.filter(category=instance).update(
+                pending_deletion=True
+            )
+        instance.pending_deletion = True
+        deletion_scheduled.send(sender=model, instance=instance)
+
+
+def get_dependents(instance):
+    """Зависимые объекты в порядке удаления, начиная с листьев."""
+    if isinstance(instance, Category):
+        return (
+            Comment.objects.filter(review__title__category=instance),
+            Review.objects.filter(title__category=instance),
+            Title.all_objects.filter(category=instance),
+        )
+    if isinstance(instance, Title):
+        return (
+            Comment.objects.filter(review__title=instance),
+            Review.objects.filter(title=instance),
+        )
+    return (
+        Comment.objects.filter(author=instance),
+        Review.objects.filter(author=instance),
+    )
+
+
+def delete_in_batches(queryset, batch_size):
+    """Удаляет объекты пакетами, после каждого пакета отдаёт их число.
+
+    Каждый пакет удаляется отдельной транзакцией, поэтому запись в базу
+    не блокируется надолго.
+    """
+    model = queryset.model
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        model._base_manager.filter(pk__in=pks).delete()
+        yield len(pks)
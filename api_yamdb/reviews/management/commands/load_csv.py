@@ -45,19 +45,19 @@ class Command(BaseCommand):
                                 title = Title.objects.get(id=title_id)
                                 genre = Genre.objects.get(id=genre_id)
 
-                                instance, created = (
-                                    model_name.genre.through.
-                                    objects.update_or_create(
-                                        title=title,
-                                        genre=genre
-                                    )
-                                )
+                                created = not title.genre.filter(
+                                    pk=genre.pk
+                                ).exists()
+                                # Связь добавляется через менеджер: сигналы
+                                # промежуточной таблицы не отправляются, а
+                                # m2m_changed сбрасывает кеш произведения
+                                title.genre.add(genre)
                                 if created:
                                     self.stdout.write(self.style.SUCCESS(
-                                        f"Создан объект {instance}"))
+                                        f"Создана связь {title} - {genre}"))
                                 else:
                                     self.stdout.write(self.style.SUCCESS(
-                                        f"Обновлен объект {instance}"))
+                                        f"Связь {title} - {genre} уже есть"))
                             else:
                                 instance, created = (
                                     model_name.objects.update_or_create(
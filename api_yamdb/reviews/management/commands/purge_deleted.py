@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from reviews.deletion import delete_in_batches, get_dependents
+from reviews.models import Category, Title
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет пакетами категории, произведения и пользователей, '
+        'удаление которых запрошено с параметром ?async=true'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.PURGE_BATCH_SIZE,
+            help='Сколько объектов удалять одной транзакцией'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между пакетами в секундах для других запросов'
+        )
+
+    def handle(self, *args, **options):
+        purged = 0
+        for model in (Category, Title, User):
+            for instance in model.all_objects.filter(pending_deletion=True):
+                self.purge(instance, options['batch_size'], options['pause'])
+                purged += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено объектов: {purged}'
+        ))
+
+    def purge(self, instance, batch_size, pause):
+        label = f'{instance._meta.verbose_name} «{instance}»'
+        for queryset in get_dependents(instance):
+            deleted = 0
+            for count in delete_in_batches(queryset, batch_size):
+                deleted += count
+                self.stdout.write(
+                    f'{label}: {queryset.model._meta.verbose_name_plural} '
+                    f'- удалено {deleted}'
+                )
+                time.sleep(pause)
+        instance.delete()
+        self.stdout.write(f'{label}: удалено')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews.search import (
+    drop_title_search_index, ensure_title_search_index, is_search_supported
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересоздаёт полнотекстовый индекс произведений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='База данных, в которой пересоздаётся индекс'
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_search_supported(using):
+            raise CommandError(
+                'Полнотекстовый индекс поддерживается только для SQLite'
+            )
+        drop_title_search_index(using)
+        ensure_title_search_index(using)
+        self.stdout.write(self.style.SUCCESS(
+            'Полнотекстовый индекс произведений пересоздан'
+        ))
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from reviews.models import Title, TitleLeaderboard
+
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает взвешенный рейтинг лучших произведений для '
+        'произведений, оценки которых изменились с прошлого запуска'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help=(
+                'Пересчитать все произведения, например после заметного '
+                'изменения средней оценки по каталогу'
+            )
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        totals = Title.objects.aggregate(
+            rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count')
+        )
+        if not totals['rating_count']:
+            TitleLeaderboard.objects.all().delete()
+            self.stdout.write('Отзывов нет, рейтинг лучших очищен')
+            return
+        mean = totals['rating_sum'] / totals['rating_count']
+        min_reviews = settings.LEADERBOARD_MIN_REVIEWS
+
+        titles = Title.objects.all()
+        last_refresh = TitleLeaderboard.objects.aggregate(
+            last=Max('refreshed')
+        )['last']
+        if last_refresh and not options['full']:
+            titles = titles.filter(rating_modified__gte=last_refresh)
+        titles = titles.values_list('id', 'rating_sum', 'rating_count')
+
+        refreshed = 0
+        batch = []
+        for row in titles.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                refreshed += self.refresh(batch, mean, min_reviews, started)
+                batch = []
+        refreshed += self.refresh(batch, mean, min_reviews, started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано произведений: {refreshed}'
+        ))
+
+    @staticmethod
+    def refresh(batch, mean, min_reviews, refreshed):
+        # Байесовская оценка: средняя оценка произведения, притянутая
+        # к средней по каталогу тем сильнее, чем меньше у него отзывов
+        entries = [
+            TitleLeaderboard(
+                title_id=title_id,
+                weighted_rating=(
+                    (rating_sum + min_reviews * mean)
+                    / (rating_count + min_reviews)
+                ),
+                refreshed=refreshed
+            )
+            for title_id, rating_sum, rating_count in batch
+            if rating_count
+        ]
+        with transaction.atomic():
+            TitleLeaderboard.objects.filter(
+                title_id__in=[title_id for title_id, _, _ in batch]
+            ).delete()
+            TitleLeaderboard.objects.bulk_create(entries)
+        return len(batch)
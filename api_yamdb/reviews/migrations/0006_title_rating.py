@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 17:12
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def fill_title_rating(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    titles = Title.objects.annotate(
+        reviews_sum=Sum('reviews__score'),
+        reviews_count=Count('reviews'),
+        reviews_avg=Avg('reviews__score')
+    ).filter(reviews_count__gt=0)
+    for title in titles:
+        title.rating_sum = title.reviews_sum
+        title.rating_count = title.reviews_count
+        title.rating = title.reviews_avg
+        title.save(update_fields=('rating_sum', 'rating_count', 'rating'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_alter_reviewsuser_confirmation_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='rating',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_title_rating, migrations.RunPython.noop),
+    ]
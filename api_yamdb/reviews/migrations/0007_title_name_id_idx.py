@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_title_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['name', 'id'], name='title_name_id_idx'),
+        ),
+    ]
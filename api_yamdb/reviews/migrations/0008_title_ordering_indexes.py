@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_title_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['year', 'id'], name='title_year_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['rating', 'id'], name='title_rating_id_idx'),
+        ),
+    ]
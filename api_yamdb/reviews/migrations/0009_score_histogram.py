@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 17:17
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_score_histograms(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    ScoreHistogram = apps.get_model('reviews', 'ScoreHistogram')
+    histograms = {}
+    counts = Review.objects.filter(title__isnull=False).values(
+        'title_id', 'score'
+    ).annotate(reviews_count=Count('id'))
+    for row in counts:
+        histogram = histograms.setdefault(
+            row['title_id'], ScoreHistogram(title_id=row['title_id'])
+        )
+        setattr(histogram, f"score_{row['score']}", row['reviews_count'])
+    ScoreHistogram.objects.bulk_create(histograms.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_title_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogram',
+            fields=[
+                ('title', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='histogram', serialize=False, to='reviews.title', verbose_name='Произведение')),
+                ('score_1', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 1')),
+                ('score_2', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 2')),
+                ('score_3', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 3')),
+                ('score_4', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 4')),
+                ('score_5', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 5')),
+                ('score_6', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 6')),
+                ('score_7', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 7')),
+                ('score_8', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 8')),
+                ('score_9', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 9')),
+                ('score_10', models.PositiveIntegerField(default=0, verbose_name='Количество оценок 10')),
+            ],
+            options={
+                'verbose_name': 'распределение оценок',
+                'verbose_name_plural': 'Распределения оценок',
+            },
+        ),
+        migrations.RunPython(fill_score_histograms, migrations.RunPython.noop),
+    ]
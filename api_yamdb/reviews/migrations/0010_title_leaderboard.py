@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 17:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_score_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleLeaderboard',
+            fields=[
+                ('title', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard', serialize=False, to='reviews.title', verbose_name='Произведение')),
+                ('weighted_rating', models.FloatField(db_index=True, verbose_name='Взвешенный рейтинг')),
+                ('refreshed', models.DateTimeField(db_index=True, verbose_name='Дата пересчёта')),
+            ],
+            options={
+                'verbose_name': 'позиция в рейтинге',
+                'verbose_name_plural': 'Рейтинг произведений',
+                'ordering': ('-weighted_rating',),
+            },
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_modified',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Дата изменения оценок'),
+        ),
+    ]
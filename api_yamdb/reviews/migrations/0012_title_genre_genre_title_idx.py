@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-18 17:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0011_modified'),
+    ]
+
+    # Таблица связей создана автоматически, индекс для фильтра по жанрам
+    # (genre_id, title_id) задаётся SQL
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX title_genre_genre_title_idx '
+            'ON reviews_title_genre (genre_id, title_id);',
+            'DROP INDEX title_genre_genre_title_idx;'
+        ),
+    ]
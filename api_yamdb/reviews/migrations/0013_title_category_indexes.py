@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_title_genre_genre_title_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['category', 'year'], name='title_category_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['category', 'name', 'id'], name='title_category_name_id_idx'),
+        ),
+    ]
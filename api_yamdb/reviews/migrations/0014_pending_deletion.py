@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 17:37
+
+import django.contrib.auth.models
+from django.db import migrations, models
+import reviews.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0013_title_category_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='reviewsuser',
+            managers=[
+                ('objects', reviews.models.VisibleUserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ожидает удаления'),
+        ),
+        migrations.AddField(
+            model_name='reviewsuser',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ожидает удаления'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ожидает удаления'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(pending_deletion=True), fields=['pending_deletion'], name='category_pending_deletion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewsuser',
+            index=models.Index(condition=models.Q(pending_deletion=True), fields=['pending_deletion'], name='user_pending_deletion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(condition=models.Q(pending_deletion=True), fields=['pending_deletion'], name='title_pending_deletion_idx'),
+        ),
+    ]
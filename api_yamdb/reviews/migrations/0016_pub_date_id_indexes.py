@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0015_review_comment_pub_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_review_pub_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_title_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['review', '-pub_date', '-id'], name='comment_review_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['title', '-pub_date', '-id'], name='review_title_pub_date_id_idx'),
+        ),
+    ]
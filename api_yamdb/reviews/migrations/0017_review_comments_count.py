@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 17:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_comments_count(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    reviews = Review.objects.annotate(
+        comments_total=Count('comments')
+    ).filter(comments_total__gt=0)
+    for review in reviews:
+        review.comments_count = review.comments_total
+        review.save(update_fields=('comments_count',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0016_pub_date_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(
+            fill_comments_count, migrations.RunPython.noop
+        ),
+    ]
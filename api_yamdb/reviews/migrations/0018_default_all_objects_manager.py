@@ -0,0 +1,38 @@
+# Generated by Django 3.2 on 2026-10-18 17:54
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0017_review_comments_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'default_manager_name': 'all_objects', 'ordering': ('name',), 'verbose_name': 'категория', 'verbose_name_plural': 'Категории'},
+        ),
+        migrations.AlterModelOptions(
+            name='reviewsuser',
+            options={'default_manager_name': 'all_objects', 'ordering': ('username',), 'verbose_name': 'пользователь', 'verbose_name_plural': 'Пользователи'},
+        ),
+        migrations.AlterModelOptions(
+            name='title',
+            options={'default_manager_name': 'all_objects', 'default_related_name': 'titles', 'ordering': ('name',), 'verbose_name': 'произведение', 'verbose_name_plural': 'Произведения'},
+        ),
+        migrations.AlterModelManagers(
+            name='category',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='title',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
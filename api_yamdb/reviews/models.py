@@ -1,10 +1,10 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import (
     MaxValueValidator, MinValueValidator
 )
-from django.db import models
+from django.db import models, transaction
 
 from .constants import (
     ADMIN_ROLE, MAX_LENGTH_EMAIL, MAX_LENGTH_FIRST_LAST_NAME,
@@ -20,11 +20,74 @@ ROLE_CHOICES = (
     (ADMIN_ROLE, 'Администратор')
 )
 
+SCORES = range(MIN_SCORE, MAX_SCORE + 1)
+
 USERNAME_HELP_TEXT = ('Обязательное поле. Только буквы,'
                       ' цифры и @/./+/-/_.')
 
 
-class ReviewsUser(AbstractUser):
+class VisibleManagerMixin:
+    """Менеджер без объектов, ожидающих фонового удаления.
+
+    Менеджер по умолчанию у моделей - all_objects: проверки уникальности,
+    связанные объекты и каскадное удаление видят и скрытые записи.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pending_deletion=False)
+
+
+class VisibleManager(VisibleManagerMixin, models.Manager):
+    pass
+
+
+class VisibleUserManager(VisibleManagerMixin, UserManager):
+    pass
+
+
+class MaintainedFieldsMixin:
+    """Поля, которые ведут сигналы и запросы UPDATE, а не save().
+
+    Обычное сохранение загруженного объекта не записывает их, иначе
+    объект, прочитанный до изменения счётчиков, вернул бы старые
+    значения. Явный update_fields записывает любые поля.
+    """
+
+    maintained_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            skipped = {*self.maintained_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+def pending_deletion_field():
+    return models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Ожидает удаления'
+    )
+
+
+def pending_deletion_index(name):
+    # Частичный индекс: в нём только строки, ожидающие удаления
+    return models.Index(
+        fields=('pending_deletion',),
+        condition=models.Q(pending_deletion=True),
+        name=name
+    )
+
+
+class ReviewsUser(MaintainedFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=MAX_LENGTH_EMAIL,
         unique=True,
@@ -62,6 +125,22 @@ class ReviewsUser(AbstractUser):
         default=settings.RESERVED_CODE,
         verbose_name='Код подтверждения'
     )
+    pending_deletion = pending_deletion_field()
+
+    objects = VisibleUserManager()
+    all_objects = UserManager()
+
+    # Скрытие ведёт schedule_deletion
+    maintained_fields = ('pending_deletion',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Имя автора входит в представление отзывов и комментариев: при его
+        # изменении обновляется их дата изменения
+        if 'username' in field_names:
+            user._loaded_username = user.username
+        return user
 
     @property
     def is_admin(self):
@@ -74,6 +153,8 @@ class ReviewsUser(AbstractUser):
         verbose_name = 'пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = 'username',
+        default_manager_name = 'all_objects'
+        indexes = (pending_deletion_index('user_pending_deletion_idx'),)
 
 
 User = get_user_model()
@@ -89,6 +170,11 @@ class NameSlugBaseModel(models.Model):
         unique=True,
         verbose_name='Путь'
     )
+    modified = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         abstract = True
@@ -109,6 +195,11 @@ class TextAuthorPubdateBaseModel(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    modified = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         abstract = True
@@ -125,13 +216,23 @@ class Genre(NameSlugBaseModel):
         verbose_name_plural = 'Жанры'
 
 
-class Category(NameSlugBaseModel):
+class Category(MaintainedFieldsMixin, NameSlugBaseModel):
+    pending_deletion = pending_deletion_field()
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    # Скрытие ведёт schedule_deletion
+    maintained_fields = ('pending_deletion',)
+
     class Meta(NameSlugBaseModel.Meta):
         verbose_name = 'категория'
         verbose_name_plural = 'Категории'
+        default_manager_name = 'all_objects'
+        indexes = (pending_deletion_index('category_pending_deletion_idx'),)
 
 
-class Title(models.Model):
+class Title(MaintainedFieldsMixin, models.Model):
     name = models.CharField(
         max_length=256,
         verbose_name='Название'
@@ -153,18 +254,161 @@ class Title(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Категория'
     )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Сумма оценок'
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество оценок'
+    )
+    rating = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Рейтинг'
+    )
+    rating_modified = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name='Дата изменения оценок'
+    )
+    modified = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+    pending_deletion = pending_deletion_field()
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    # Рейтинг ведут сигналы отзывов, скрытие - schedule_deletion
+    maintained_fields = (
+        'rating_sum', 'rating_count', 'rating', 'rating_modified',
+        'pending_deletion'
+    )
 
     class Meta:
         verbose_name = 'произведение'
         verbose_name_plural = 'Произведения'
         default_related_name = 'titles'
         ordering = ('name',)
+        default_manager_name = 'all_objects'
+        indexes = (
+            models.Index(fields=('name', 'id'), name='title_name_id_idx'),
+            models.Index(fields=('year', 'id'), name='title_year_id_idx'),
+            models.Index(
+                fields=('rating', 'id'), name='title_rating_id_idx'
+            ),
+            # Фильтр по категории вместе с диапазоном лет или сортировкой
+            models.Index(
+                fields=('category', 'year'), name='title_category_year_idx'
+            ),
+            models.Index(
+                fields=('category', 'name', 'id'),
+                name='title_category_name_id_idx'
+            ),
+            pending_deletion_index('title_pending_deletion_idx'),
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        title = super().from_db(db, field_names, values)
+        # Название входит в индекс автодополнения: другие изменения
+        # произведения индекс не затрагивают
+        if 'name' in field_names:
+            title._loaded_name = title.name
+        return title
 
     def __str__(self):
         return self.name[:MAX_STR_LEN]
 
 
-class Review(TextAuthorPubdateBaseModel):
+class ScoreHistogram(models.Model):
+    title = models.OneToOneField(
+        Title,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='histogram',
+        verbose_name='Произведение'
+    )
+
+    class Meta:
+        verbose_name = 'распределение оценок'
+        verbose_name_plural = 'Распределения оценок'
+
+    def __str__(self):
+        return str(self.title)
+
+    @staticmethod
+    def score_field(score):
+        return f'score_{score}'
+
+    @property
+    def distribution(self):
+        return {
+            score: getattr(self, self.score_field(score)) for score in SCORES
+        }
+
+    @property
+    def count(self):
+        return sum(self.distribution.values())
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return sum(
+            score * count for score, count in self.distribution.items()
+        ) / self.count
+
+
+def add_score_fields():
+    """Поле-счётчик для каждой допустимой оценки от MIN_SCORE до MAX_SCORE."""
+    for score in SCORES:
+        ScoreHistogram.add_to_class(
+            ScoreHistogram.score_field(score),
+            models.PositiveIntegerField(
+                default=0, verbose_name=f'Количество оценок {score}'
+            )
+        )
+
+
+add_score_fields()
+
+
+class TitleLeaderboard(models.Model):
+    title = models.OneToOneField(
+        Title,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='leaderboard',
+        verbose_name='Произведение'
+    )
+    weighted_rating = models.FloatField(
+        db_index=True,
+        verbose_name='Взвешенный рейтинг'
+    )
+    refreshed = models.DateTimeField(
+        db_index=True,
+        verbose_name='Дата пересчёта'
+    )
+
+    class Meta:
+        verbose_name = 'позиция в рейтинге'
+        verbose_name_plural = 'Рейтинг произведений'
+        ordering = ('-weighted_rating',)
+
+    def __str__(self):
+        return f'{self.title}: {self.weighted_rating:.2f}'
+
+
+class Review(MaintainedFieldsMixin, TextAuthorPubdateBaseModel):
     score = models.PositiveIntegerField(
         verbose_name='Оценка',
         validators=[MaxValueValidator(MAX_SCORE,),
@@ -176,6 +420,14 @@ class Review(TextAuthorPubdateBaseModel):
         null=True,
         verbose_name='Произведение'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
+
+    # Количество комментариев ведут сигналы комментариев
+    maintained_fields = ('comments_count',)
 
     class Meta(TextAuthorPubdateBaseModel.Meta):
         verbose_name = 'отзыв'
@@ -186,6 +438,28 @@ class Review(TextAuthorPubdateBaseModel):
                 name='one_review_per_title'
             ),
         )
+        # Отзывы произведения в порядке сортировки, в том числе курсорной
+        # по (pub_date, id), читаются по индексу
+        indexes = (
+            models.Index(
+                fields=('title', '-pub_date', '-id'),
+                name='review_title_pub_date_id_idx'
+            ),
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        review = super().from_db(db, field_names, values)
+        # Запоминаем сохранённые значения, чтобы при изменении отзыва
+        # скорректировать рейтинг на разницу, а не пересчитывать его заново
+        if {'title_id', 'score'} <= set(field_names):
+            review._loaded_rating = (review.title_id, review.score)
+        return review
+
+    def save(self, *args, **kwargs):
+        # Рейтинг произведения обновляется в той же транзакции, что и отзыв
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Comment(TextAuthorPubdateBaseModel):
@@ -198,3 +472,14 @@ class Comment(TextAuthorPubdateBaseModel):
     class Meta(TextAuthorPubdateBaseModel.Meta):
         verbose_name = 'комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('review', '-pub_date', '-id'),
+                name='comment_review_pub_date_id_idx'
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев отзыва обновляется в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
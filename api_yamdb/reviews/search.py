@@ -0,0 +1,109 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from reviews.models import Title
+
+
+TITLE_TABLE = Title._meta.db_table
+SEARCH_TABLE = f'{TITLE_TABLE}_fts'
+
+SEARCH_TABLE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+    f"name, description, content='{TITLE_TABLE}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+INSERT_ROW_SQL = (
+    f'INSERT INTO {SEARCH_TABLE}(rowid, name, description) '
+    'VALUES (new.id, new.name, new.description);'
+)
+DELETE_ROW_SQL = (
+    f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, description) '
+    "VALUES ('delete', old.id, old.name, old.description);"
+)
+SEARCH_TRIGGERS_SQL = {
+    f'{SEARCH_TABLE}_insert': (
+        f'AFTER INSERT ON {TITLE_TABLE} BEGIN {INSERT_ROW_SQL} END'
+    ),
+    f'{SEARCH_TABLE}_delete': (
+        f'AFTER DELETE ON {TITLE_TABLE} BEGIN {DELETE_ROW_SQL} END'
+    ),
+    f'{SEARCH_TABLE}_update': (
+        f'AFTER UPDATE OF name, description ON {TITLE_TABLE} '
+        f'BEGIN {DELETE_ROW_SQL} {INSERT_ROW_SQL} END'
+    ),
+}
+
+
+def is_search_supported(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def ensure_title_search_index(using='default'):
+    """Создаёт индекс и триггеры, если их нет, и заполняет индекс заново.
+
+    SQLite пересоздаёт таблицу произведений при изменении её схемы,
+    и вместе со старой таблицей удаляются триггеры индекса.
+    """
+    if not is_search_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            (f'{SEARCH_TABLE}%',)
+        )
+        existing = {name for name, in cursor.fetchall()}
+        missing = {SEARCH_TABLE, *SEARCH_TRIGGERS_SQL} - existing
+        if not missing:
+            return
+        cursor.execute(SEARCH_TABLE_SQL)
+        for name, sql in SEARCH_TRIGGERS_SQL.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {sql}')
+    rebuild_title_search_index(using)
+
+
+def rebuild_title_search_index(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def drop_title_search_index(using='default'):
+    with connections[using].cursor() as cursor:
+        for name in SEARCH_TRIGGERS_SQL:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def to_match_expression(query):
+    # Каждое слово экранируется кавычками, чтобы пользовательский ввод
+    # не разбирался как синтаксис запросов FTS5; последнее слово ищется
+    # по префиксу
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search_titles(queryset, query):
+    """Отбирает произведения по запросу и сортирует по релевантности."""
+    match = to_match_expression(query)
+    if match is None:
+        return queryset.none()
+    if not is_search_supported(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        )
+    return queryset.extra(
+        tables=(SEARCH_TABLE,),
+        where=(
+            f'{SEARCH_TABLE}.rowid = {TITLE_TABLE}.id',
+            f'{SEARCH_TABLE} MATCH %s',
+        ),
+        params=(match,),
+        select={'search_rank': f'{SEARCH_TABLE}.rank'},
+        order_by=('search_rank', 'id'),
+    )
@@ -0,0 +1,212 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast, NullIf
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from reviews.models import (
+    SCORES, Category, Comment, Genre, Review, ReviewsUser, ScoreHistogram,
+    Title
+)
+from reviews.search import ensure_title_search_index
+
+
+# Объект скрыт и ждёт фонового удаления: аргумент instance
+deletion_scheduled = Signal()
+
+
+def shift_title_rating(title_id, score_delta, count_delta):
+    """Сдвигает хранимые сумму и количество оценок одним UPDATE."""
+    if title_id is None:
+        return
+    now = timezone.now()
+    rating_sum = F('rating_sum') + score_delta
+    rating_count = F('rating_count') + count_delta
+    Title.objects.filter(pk=title_id).update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating=Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+        rating_modified=now,
+        modified=now
+    )
+
+
+def shift_score_histogram(title_id, score_deltas):
+    """Сдвигает счётчики оценок произведения: {оценка: изменение}."""
+    if title_id is None:
+        return
+    histograms = ScoreHistogram.objects.filter(pk=title_id)
+    if histograms.update(**{
+        ScoreHistogram.score_field(score): (
+            F(ScoreHistogram.score_field(score)) + delta
+        )
+        for score, delta in score_deltas.items()
+    }):
+        return
+    # Строка создаётся только при появлении оценки: при каскадном удалении
+    # произведения её уже может не быть, и создавать её заново нельзя
+    if any(delta > 0 for delta in score_deltas.values()):
+        ScoreHistogram.objects.create(title_id=title_id, **{
+            ScoreHistogram.score_field(score): max(delta, 0)
+            for score, delta in score_deltas.items()
+        })
+
+
+def count_review(title_id, score, sign):
+    """Учитывает (sign=1) или исключает (sign=-1) оценку в агрегатах."""
+    shift_title_rating(title_id, sign * score, sign)
+    shift_score_histogram(title_id, {score: sign})
+
+
+def recount_title_aggregates(title_ids):
+    """Пересчитывает рейтинг и распределение оценок произведений заново.
+
+    Для пакетных записей отзывов, которые не отправляют сигналы: один
+    запрос агрегации и по одному обновлению на все произведения.
+    """
+    title_ids = set(title_ids)
+    scores = defaultdict(dict)
+    for row in Review.objects.filter(title_id__in=title_ids).values(
+        'title_id', 'score'
+    ).annotate(count=Count('id')).order_by():
+        scores[row['title_id']][row['score']] = row['count']
+    now = timezone.now()
+    titles = []
+    for title_id in title_ids:
+        rating_sum = sum(
+            score * count for score, count in scores[title_id].items()
+        )
+        rating_count = sum(scores[title_id].values())
+        titles.append(Title(
+            pk=title_id,
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=rating_sum / rating_count if rating_count else None,
+            rating_modified=now,
+            modified=now
+        ))
+    Title.all_objects.bulk_update(titles, (
+        'rating_sum', 'rating_count', 'rating', 'rating_modified', 'modified'
+    ))
+    existing = set(ScoreHistogram.objects.filter(
+        pk__in=title_ids
+    ).values_list('pk', flat=True))
+    histograms = [
+        ScoreHistogram(title_id=title_id, **{
+            ScoreHistogram.score_field(score): scores[title_id].get(score, 0)
+            for score in SCORES
+        })
+        for title_id in title_ids
+    ]
+    ScoreHistogram.objects.bulk_update(
+        [histogram for histogram in histograms if histogram.pk in existing],
+        [ScoreHistogram.score_field(score) for score in SCORES]
+    )
+    ScoreHistogram.objects.bulk_create(
+        histogram for histogram in histograms if histogram.pk not in existing
+    )
+
+
+@receiver(post_save, sender=Review)
+def update_aggregates_on_review_save(sender, instance, created, **kwargs):
+    if created:
+        count_review(instance.title_id, instance.score, 1)
+    elif hasattr(instance, '_loaded_rating'):
+        loaded_title_id, loaded_score = instance._loaded_rating
+        if loaded_title_id != instance.title_id:
+            count_review(loaded_title_id, loaded_score, -1)
+            count_review(instance.title_id, instance.score, 1)
+        elif loaded_score != instance.score:
+            shift_title_rating(
+                instance.title_id, instance.score - loaded_score, 0
+            )
+            shift_score_histogram(
+                instance.title_id, {loaded_score: -1, instance.score: 1}
+            )
+    instance._loaded_rating = (instance.title_id, instance.score)
+
+
+@receiver(post_delete, sender=Review)
+def update_aggregates_on_review_delete(sender, instance, **kwargs):
+    # Срабатывает и при каскадном удалении пользователя или произведения
+    title_id, score = getattr(
+        instance, '_loaded_rating', (instance.title_id, instance.score)
+    )
+    count_review(title_id, score, -1)
+
+
+def shift_comments_count(review_id, delta):
+    # Последний комментарий входит в представление отзыва, поэтому дата
+    # изменения отзыва обновляется при любой записи комментария
+    Review.objects.filter(pk=review_id).update(
+        comments_count=F('comments_count') + delta,
+        modified=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Comment)
+def update_comments_count_on_save(sender, instance, created, **kwargs):
+    shift_comments_count(instance.review_id, 1 if created else 0)
+
+
+@receiver(post_delete, sender=Comment)
+def update_comments_count_on_delete(sender, instance, **kwargs):
+    # При каскадном удалении отзыва строки уже нет, и UPDATE ничего не меняет
+    shift_comments_count(instance.review_id, -1)
+
+
+# Название жанра и категории входит в представление произведения, поэтому
+# их изменение обновляет дату изменения связанных произведений. Удаление
+# категории удаляет и произведения, а удаление жанра меняет только связи.
+@receiver(pre_delete, sender=Genre)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Category)
+def touch_related_titles(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    Title.objects.filter(
+        **{'genre' if sender is Genre else 'category': instance}
+    ).update(modified=timezone.now())
+
+
+# Жанры входят в представление произведения, поэтому изменение связей
+# обновляет дату изменения произведений. При очистке со стороны жанра
+# список произведений доступен только до удаления связей.
+@receiver(m2m_changed, sender=Title.genre.through)
+def touch_titles_on_genre_links(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set:
+        titles = Title.objects.filter(pk__in=pk_set) if reverse else (
+            Title.objects.filter(pk=instance.pk)
+        )
+    elif action == 'pre_clear' and reverse:
+        titles = Title.objects.filter(genre=instance)
+    elif action == 'post_clear' and not reverse:
+        titles = Title.objects.filter(pk=instance.pk)
+    else:
+        return
+    titles.update(modified=timezone.now())
+
+
+@receiver(post_save, sender=ReviewsUser)
+def touch_authored_reviews(sender, instance, created, **kwargs):
+    loaded_username = getattr(instance, '_loaded_username', None)
+    instance._loaded_username = instance.username
+    if created or loaded_username in (None, instance.username):
+        return
+    now = timezone.now()
+    Comment.objects.filter(author=instance).update(modified=now)
+    # Комментарий автора выводится и в превью последнего комментария отзыва
+    Review.objects.filter(
+        Q(author=instance) | Q(pk__in=Comment.objects.filter(
+            author=instance
+        ).values('review_id'))
+    ).update(modified=now)
+
+
+def ensure_search_index(sender, using, **kwargs):
+    ensure_title_search_index(using)
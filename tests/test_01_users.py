@@ -489,6 +489,13 @@ class Test01UserAPI:
                 'данные.'
             )
 
+    def test_09_01_users_me_sparse_fields(self, user_client, user):
+        response = user_client.get(f'{self.USERS_ME_URL}?fields=username')
+        assert response.json() == {'username': user.username}, (
+            f'Проверьте, что GET-запрос к `{self.USERS_ME_URL}` учитывает '
+            'параметр `?fields=`.'
+        )
+
     def test_09_02_users_me_delete_not_allowed(self, user_client, user,
                                                django_user_model):
         response = user_client.delete(f'{self.USERS_ME_URL}')
@@ -1,11 +1,15 @@
+from datetime import datetime, timezone
 from http import HTTPStatus
 
 import pytest
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 
+from reviews.models import Comment, Review, Title
 from tests.utils import (
-    check_fields, check_pagination, create_reviews, create_single_review,
-    create_titles
+    check_fields, check_pagination, create_authors, create_reviews,
+    create_single_review, create_titles, read_export
 )
 
 
@@ -413,3 +417,291 @@ class Test05ReviewAPI:
             f'Проверьте, что PUT-запрос к `{self.REVIEW_DETAIL_URL_TEMPLATE} '
             'не предусмотрен и возвращает статус 405.'
         )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test05ReviewQueries:
+
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+    EXPORT_URL = '/api/v1/reviews/export/'
+
+    def create_title(self, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        title = Title.objects.get(pk=titles[0]['id'])
+        return title, self.REVIEWS_URL_TEMPLATE.format(title_id=title.id)
+
+    def test_01_review_parent_lookup(self, client, admin_client,
+                                     user_client):
+        _, reviews_url = self.create_title(admin_client)
+        user_client.post(reviews_url, data={'text': 'Отзыв', 'score': 5})
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reviews_url)
+        assert response.json()['count'] == 1
+        parent_queries = [
+            query for query in context.captured_queries
+            if 'FROM "reviews_title"' in query['sql']
+        ]
+        assert len(parent_queries) == 1, (
+            f'Проверьте, что GET-запрос к `{reviews_url}` проверяет '
+            'произведение одним запросом.'
+        )
+        response = client.get(f'{reviews_url}abc/')
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что запрос отзыва с нечисловым id возвращает ответ '
+            'со статусом 404.'
+        )
+
+    def test_02_review_list_query_budget(self, client, admin_client,
+                                         django_user_model,
+                                         django_assert_num_queries):
+        title, reviews_url = self.create_title(admin_client)
+        for author in create_authors(django_user_model, 15):
+            Review.objects.create(
+                author=author, title=title, text='Отзыв', score=5
+            )
+        # Проверка произведения, условный GET, COUNT и страница с авторами
+        with django_assert_num_queries(4):
+            response = client.get(reviews_url)
+        assert response.json()['results'][0]['author'].startswith('author')
+
+        sql, params = Review.objects.filter(
+            title=title
+        ).order_by('-pub_date').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        assert 'review_title_pub_date_id_idx' in plan and (
+            'TEMP B-TREE' not in plan
+        ), (
+            'Проверьте, что отзывы произведения читаются в порядке '
+            'сортировки по индексу (title_id, pub_date DESC, id DESC).'
+        )
+
+    def test_03_review_single_insert(self, admin_client, user_client):
+        title, reviews_url = self.create_title(admin_client)
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.post(
+                reviews_url, data={'text': 'Отзыв', 'score': 7}
+            )
+        assert response.status_code == HTTPStatus.CREATED
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if '"reviews_review"' in query['sql']
+            or 'FROM "reviews_title"' in query['sql']
+        ]
+        assert statements == ['SELECT', 'INSERT'], (
+            'Проверьте, что создание отзыва выполняет только проверку '
+            'произведения и вставку отзыва.'
+        )
+        response = user_client.post(
+            reviews_url, data={'text': 'Ещё отзыв', 'score': 3}
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'non_field_errors' in response.json(), (
+            'Проверьте, что повторный отзыв возвращает ошибку '
+            '`non_field_errors`.'
+        )
+        assert Title.objects.get(pk=title.id).rating == 7
+
+    def test_04_review_cursor_pagination(self, client, admin_client,
+                                         django_user_model,
+                                         django_assert_num_queries):
+        title, reviews_url = self.create_title(admin_client)
+        authors = create_authors(django_user_model, 26)
+        for author in authors[:25]:
+            Review.objects.create(
+                author=author, title=title, text='Отзыв', score=5
+            )
+        expected = list(Review.objects.filter(title=title).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+
+        # Проверка произведения и страница: без COUNT и агрегата по отзывам
+        with django_assert_num_queries(2):
+            data = client.get(f'{reviews_url}?pagination=cursor').json()
+        assert 'count' not in data and data['previous'], (
+            f'Проверьте, что курсорный режим `{reviews_url}` не считает '
+            'количество отзывов и возвращает ссылку на новые отзывы.'
+        )
+        newer_url = data['previous']
+        ids = [review['id'] for review in data['results']]
+        while data['next']:
+            assert 'before=' in data['next']
+            with django_assert_num_queries(2):
+                data = client.get(data['next']).json()
+            ids += [review['id'] for review in data['results']]
+        assert ids == expected, (
+            f'Проверьте, что курсорная пагинация `{reviews_url}` возвращает '
+            'все отзывы от новых к старым без повторов.'
+        )
+
+        data = client.get(newer_url).json()
+        assert data['results'] == [] and data['previous'] == newer_url
+        review = Review.objects.create(
+            author=authors[-1], title=title, text='Новый отзыв', score=5
+        )
+        data = client.get(newer_url).json()
+        assert [item['id'] for item in data['results']] == [review.id], (
+            f'Проверьте, что курсор `after` эндпоинта `{reviews_url}` '
+            'возвращает отзывы, появившиеся после курсора.'
+        )
+        response = client.get(f'{reviews_url}?before=broken')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_05_review_comments_preview(self, client, admin_client,
+                                        user_client, django_user_model,
+                                        django_assert_num_queries,
+                                        monkeypatch):
+        title, reviews_url = self.create_title(admin_client)
+        reviews = []
+        for idx, author in enumerate(create_authors(django_user_model, 3)):
+            reviews.append(Review.objects.create(
+                author=author, title=title, text='Отзыв', score=5
+            ))
+            for number in range(idx + 1):
+                Comment.objects.create(
+                    author=author, review=reviews[-1],
+                    text=f'Комментарий {number}'
+                )
+        response = user_client.post(
+            f'{reviews_url}{reviews[0].id}/comments/',
+            data={'text': 'Свежий комментарий'}
+        )
+        user_client.delete(
+            f'{reviews_url}{reviews[0].id}/comments/{response.json()["id"]}/'
+        )
+        Comment.objects.filter(review=reviews[2]).latest('id').delete()
+
+        data = client.get(reviews_url).json()['results']
+        assert {item['id']: item['comments_count'] for item in data} == {
+            reviews[0].id: 1, reviews[1].id: 2, reviews[2].id: 2
+        }, (
+            f'Проверьте, что `{reviews_url}` возвращает количество '
+            'комментариев отзыва и оно обновляется при их изменении.'
+        )
+        assert 'latest_comment' not in data[0]
+
+        # Проверка произведения, условный GET, COUNT, страница и комментарии
+        with django_assert_num_queries(5):
+            response = client.get(
+                f'{reviews_url}?fields=id,comments_count,latest_comment'
+            )
+        previews = {
+            item['id']: item['latest_comment']['text']
+            for item in response.json()['results']
+        }
+        assert previews == {
+            reviews[0].id: 'Комментарий 0',
+            reviews[1].id: 'Комментарий 1',
+            reviews[2].id: 'Комментарий 1',
+        }, (
+            f'Проверьте, что `{reviews_url}?fields=latest_comment` '
+            'возвращает последний комментарий каждого отзыва одним запросом.'
+        )
+
+        response = admin_client.patch(
+            f'{reviews_url}{reviews[1].id}/', data={'text': 'Новый текст'}
+        )
+        assert response.json()['comments_count'] == 2
+        stale_review = Review.objects.get(pk=reviews[1].id)
+        Comment.objects.create(
+            author=reviews[1].author, review=reviews[1], text='Ещё один'
+        )
+        stale_review.text = 'Старый объект'
+        stale_review.save()
+        assert Review.objects.get(pk=reviews[1].id).comments_count == 3, (
+            'Проверьте, что изменение отзыва не сбрасывает количество '
+            'комментариев.'
+        )
+
+        def fail(review_id, delta):
+            raise RuntimeError
+
+        monkeypatch.setattr('reviews.signals.shift_comments_count', fail)
+        with pytest.raises(RuntimeError):
+            Comment.objects.create(
+                author=reviews[0].author, review=reviews[0], text='Сбой'
+            )
+        assert not Comment.objects.filter(text='Сбой').exists(), (
+            'Проверьте, что комментарий и счётчик комментариев отзыва '
+            'сохраняются в одной транзакции.'
+        )
+
+    def test_06_review_export(self, client, admin_client, user_client,
+                              django_user_model):
+        titles, _, _ = create_titles(admin_client)
+        authors = create_authors(django_user_model, 3)
+        for idx, author in enumerate(authors):
+            for title in titles:
+                Review.objects.create(
+                    author=author, title_id=title['id'], text='Отзыв',
+                    score=idx + 1
+                )
+        Review.objects.filter(author=authors[0]).update(
+            pub_date=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+
+        for some_client, status in ((client, HTTPStatus.UNAUTHORIZED),
+                                    (user_client, HTTPStatus.FORBIDDEN)):
+            assert some_client.get(self.EXPORT_URL).status_code == status, (
+                f'Проверьте, что `{self.EXPORT_URL}` доступен только '
+                'администратору.'
+            )
+        rows = read_export(admin_client, self.EXPORT_URL)
+        assert [row['id'] for row in rows] == list(
+            Review.objects.order_by('id').values_list('id', flat=True)
+        ), (
+            f'Проверьте, что `{self.EXPORT_URL}` выгружает все отзывы по '
+            'одному объекту JSON на строку.'
+        )
+        assert set(rows[0]) == {
+            'id', 'title', 'author', 'text', 'score', 'pub_date',
+            'comments_count'
+        }
+        Review.objects.filter(pk=rows[-1]['id']).update(
+            pub_date=datetime(
+                2021, 6, 1, 12, 0, 0, 123456, tzinfo=timezone.utc
+            )
+        )
+        last_row = read_export(admin_client, self.EXPORT_URL)[-1]
+        assert last_row['pub_date'] == '2021-06-01T12:00:00.123456Z', (
+            f'Проверьте, что `{self.EXPORT_URL}` выгружает дату публикации '
+            'с микросекундами, как в ответах API.'
+        )
+        review = Review.objects.get(pk=last_row['id'])
+        assert client.get(
+            self.REVIEWS_URL_TEMPLATE.format(title_id=review.title_id)
+            + f'{review.id}/'
+        ).json()['pub_date'] == last_row['pub_date']
+
+        rows = read_export(
+            admin_client,
+            f'{self.EXPORT_URL}?title={titles[1]["id"]}'
+            '&since=2021-01-01T00:00:00'
+        )
+        assert sorted(row['author'] for row in rows) == [
+            'author1', 'author2'
+        ], (
+            f'Проверьте, что `{self.EXPORT_URL}` фильтрует по произведению '
+            'и дате публикации.'
+        )
+        assert [row['score'] for row in read_export(
+            admin_client, f'{self.EXPORT_URL}?author=author1&until=2030-01-01'
+        )] == [2, 2]
+        response = admin_client.get(f'{self.EXPORT_URL}?since=вчера')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_07_review_etag_follows_author_rename(self, client, admin_client,
+                                                  user_client, user):
+        title, reviews_url = self.create_title(admin_client)
+        user_client.post(reviews_url, data={'text': 'Отзыв', 'score': 5})
+        etag = client.get(reviews_url)['ETag']
+        admin_client.patch(
+            f'/api/v1/users/{user.username}/', data={'username': 'Renamed'}
+        )
+        response = client.get(reviews_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что переименование автора меняет `ETag` списка '
+            'отзывов.'
+        )
+        assert response.json()['results'][0]['author'] == 'Renamed'
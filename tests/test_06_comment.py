@@ -1,9 +1,14 @@
 from http import HTTPStatus
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from tests.utils import (check_fields, check_pagination, create_comments,
-                         create_reviews, create_single_comment)
+from reviews.models import Comment, Review
+from tests.utils import (check_fields, check_pagination, create_authors,
+                         create_comments, create_reviews,
+                         create_single_comment, create_single_review,
+                         create_titles, read_export)
 
 
 @pytest.mark.django_db(transaction=True)
@@ -366,3 +371,130 @@ class Test06CommentAPI:
             f'Проверьте, что PUT-запрос к `{self.COMMENT_DETAIL_URL_TEMPLATE} '
             'не предусмотрен и возвращает статус 405.'
         )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test06CommentQueries:
+
+    COMMENTS_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/comments/'
+    )
+    EXPORT_URL = '/api/v1/comments/export/'
+
+    def test_01_comment_parent_lookup(self, client, admin_client,
+                                      user_client):
+        titles, _, _ = create_titles(admin_client)
+        response = create_single_review(
+            user_client, titles[0]['id'], 'Отзыв', 7
+        )
+        comments_url = self.COMMENTS_URL_TEMPLATE.format(
+            title_id=titles[0]['id'], review_id=response.json()['id']
+        )
+        user_client.post(comments_url, data={'text': 'Комментарий'})
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(comments_url)
+        assert response.json()['count'] == 1
+        parent_queries = [
+            query for query in context.captured_queries
+            if 'FROM "reviews_review"' in query['sql']
+        ]
+        assert len(parent_queries) == 1, (
+            f'Проверьте, что GET-запрос к `{comments_url}` проверяет отзыв и '
+            'произведение одним запросом.'
+        )
+        response = client.get(comments_url.replace(
+            f'/{titles[0]["id"]}/', f'/{titles[1]["id"]}/'
+        ))
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что комментарии отзыва доступны только по адресу '
+            'его произведения.'
+        )
+        response = client.get(f'{comments_url}abc/')
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что запрос комментария с нечисловым id возвращает '
+            'ответ со статусом 404.'
+        )
+
+    def test_02_comment_list_query_budget(self, client, admin_client,
+                                          user_client, django_user_model,
+                                          django_assert_num_queries):
+        titles, _, _ = create_titles(admin_client)
+        response = create_single_review(
+            user_client, titles[0]['id'], 'Отзыв', 7
+        )
+        review_id = response.json()['id']
+        for author in create_authors(django_user_model, 15):
+            Comment.objects.create(
+                author=author, review_id=review_id, text='Комментарий'
+            )
+        # Проверка родителей, условный GET, COUNT и страница с авторами
+        with django_assert_num_queries(4):
+            response = client.get(self.COMMENTS_URL_TEMPLATE.format(
+                title_id=titles[0]['id'], review_id=review_id
+            ))
+        assert response.json()['results'][0]['author'].startswith('author')
+
+    def test_03_comment_export(self, client, admin_client, user_client,
+                               django_user_model):
+        titles, _, _ = create_titles(admin_client)
+        authors = create_authors(django_user_model, 3)
+        for author in authors:
+            for title in titles:
+                review = Review.objects.create(
+                    author=author, title_id=title['id'], text='Отзыв',
+                    score=5
+                )
+                Comment.objects.create(
+                    author=authors[0], review=review, text='Комментарий'
+                )
+
+        for some_client, status in ((client, HTTPStatus.UNAUTHORIZED),
+                                    (user_client, HTTPStatus.FORBIDDEN)):
+            assert some_client.get(self.EXPORT_URL).status_code == status, (
+                f'Проверьте, что `{self.EXPORT_URL}` доступен только '
+                'администратору.'
+            )
+        rows = read_export(admin_client, self.EXPORT_URL)
+        assert [row['id'] for row in rows] == list(
+            Comment.objects.order_by('id').values_list('id', flat=True)
+        ), (
+            f'Проверьте, что `{self.EXPORT_URL}` выгружает все комментарии '
+            'по одному объекту JSON на строку.'
+        )
+        assert set(rows[0]) == {
+            'id', 'title', 'review', 'author', 'text', 'pub_date'
+        }
+        rows = read_export(
+            admin_client,
+            f'{self.EXPORT_URL}?title={titles[0]["id"]}&author=author0'
+        )
+        assert len(rows) == 3 and {row['title'] for row in rows} == {
+            titles[0]['id']
+        }, (
+            f'Проверьте, что `{self.EXPORT_URL}` фильтрует по произведению '
+            'и автору.'
+        )
+
+    def test_04_comment_etag_follows_author_rename(self, client,
+                                                   admin_client,
+                                                   user_client, user):
+        titles, _, _ = create_titles(admin_client)
+        response = create_single_review(
+            admin_client, titles[0]['id'], 'Отзыв', 7
+        )
+        comments_url = self.COMMENTS_URL_TEMPLATE.format(
+            title_id=titles[0]['id'], review_id=response.json()['id']
+        )
+        user_client.post(comments_url, data={'text': 'Комментарий'})
+        reviews_url = f'/api/v1/titles/{titles[0]["id"]}/reviews/'
+        etags = {url: client.get(url)['ETag']
+                 for url in (comments_url, reviews_url)}
+        admin_client.patch(
+            f'/api/v1/users/{user.username}/', data={'username': 'Renamed'}
+        )
+        for url, etag in etags.items():
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.OK, (
+                f'Проверьте, что переименование автора комментария меняет '
+                f'`ETag` ответа `{url}`.'
+            )
@@ -0,0 +1,328 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from api.serializers import ReviewImportListSerializer
+from reviews.models import Review, Title
+from tests.utils import create_single_review, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08TitleRating:
+
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    REVIEW_DETAIL_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/'
+    )
+
+    def get_title(self, client, title_id):
+        response = client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=title_id)
+        )
+        assert response.status_code == HTTPStatus.OK
+        return response.json()
+
+    def test_01_rating_follows_review_writes(self, client, admin_client,
+                                             user_client, moderator_client,
+                                             moderator):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        create_single_review(user_client, title_id, 'Отзыв', 2)
+        response = create_single_review(
+            moderator_client, title_id, 'Отзыв', 6
+        )
+        assert self.get_title(client, title_id)['rating'] == 4, (
+            'Проверьте, что рейтинг произведения пересчитывается при '
+            'добавлении отзыва.'
+        )
+
+        review_url = self.REVIEW_DETAIL_URL_TEMPLATE.format(
+            title_id=title_id, review_id=response.json()['id']
+        )
+        moderator_client.patch(review_url, data={'score': 10})
+        assert self.get_title(client, title_id)['rating'] == 6, (
+            'Проверьте, что рейтинг произведения пересчитывается при '
+            'изменении оценки в отзыве.'
+        )
+
+        moderator_client.delete(review_url)
+        assert self.get_title(client, title_id)['rating'] == 2, (
+            'Проверьте, что рейтинг произведения пересчитывается при '
+            'удалении отзыва.'
+        )
+
+        create_single_review(moderator_client, title_id, 'Отзыв', 8)
+        moderator.delete()
+        assert self.get_title(client, title_id)['rating'] == 2, (
+            'Проверьте, что рейтинг произведения пересчитывается при '
+            'каскадном удалении отзывов вместе с автором.'
+        )
+
+        user_client.delete(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=title_id,
+                review_id=user_client.get(
+                    f'/api/v1/titles/{title_id}/reviews/'
+                ).json()['results'][0]['id']
+            )
+        )
+        assert self.get_title(client, title_id)['rating'] is None, (
+            'Если у произведения не осталось отзывов - значением поля '
+            '`rating` должно быть `None`.'
+        )
+
+    def test_02_title_score_histogram(self, client, admin_client,
+                                      user_client, moderator_client,
+                                      django_assert_num_queries):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        stats_url = f'/api/v1/titles/{title_id}/stats/'
+        response = client.get(stats_url)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{stats_url}` возвращает ответ со '
+            'статусом 200.'
+        )
+        assert response.json()['count'] == 0
+        assert response.json()['mean'] is None
+
+        create_single_review(user_client, title_id, 'Отзыв', 3)
+        response = create_single_review(
+            moderator_client, title_id, 'Отзыв', 3
+        )
+        moderator_client.patch(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=title_id, review_id=response.json()['id']
+            ),
+            data={'score': 10}
+        )
+        with django_assert_num_queries(1):
+            data = client.get(stats_url).json()
+        expected_scores = {str(score): 0 for score in range(1, 11)}
+        expected_scores.update({'3': 1, '10': 1})
+        assert data == {
+            'scores': expected_scores, 'count': 2, 'mean': 6.5
+        }, (
+            f'Проверьте, что `{stats_url}` возвращает распределение оценок, '
+            'количество отзывов и среднюю оценку.'
+        )
+
+        for title_id in (0, 'abc'):
+            response = client.get(f'/api/v1/titles/{title_id}/stats/')
+            assert response.status_code == HTTPStatus.NOT_FOUND, (
+                'Проверьте, что запрос распределения оценок '
+                'несуществующего произведения возвращает ответ со статусом '
+                '404.'
+            )
+
+    def test_03_title_leaderboard(self, client, admin_client,
+                                  django_user_model):
+        titles, categories, _ = create_titles(admin_client)
+        third_title = Title.objects.create(
+            name='Третье', year=2000, category_id=Title.objects.get(
+                pk=titles[0]['id']
+            ).category_id
+        )
+        authors = [
+            django_user_model.objects.create_user(
+                username=f'author{idx}', email=f'author{idx}@yamdb.fake'
+            )
+            for idx in range(5)
+        ]
+        Review.objects.create(
+            author=authors[0], title_id=titles[0]['id'], text='Отзыв', score=10
+        )
+        for author in authors:
+            Review.objects.create(
+                author=author, title_id=titles[1]['id'], text='Отзыв', score=9
+            )
+            Review.objects.create(
+                author=author, title=third_title, text='Отзыв', score=2
+            )
+        call_command('refresh_leaderboard', stdout=StringIO())
+
+        top_url = '/api/v1/titles/top/'
+        response = client.get(top_url)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{top_url}` возвращает ответ со '
+            'статусом 200.'
+        )
+        results = response.json()['results']
+        assert [title['id'] for title in results] == [
+            titles[1]['id'], titles[0]['id'], third_title.id
+        ], (
+            f'Проверьте, что `{top_url}` сортирует произведения по '
+            'взвешенному рейтингу, а не по средней оценке.'
+        )
+        mean = 65 / 11
+        assert results[0]['weighted_rating'] == pytest.approx(
+            (45 + 10 * mean) / 15
+        )
+        response = client.get(f'{top_url}?category={categories[0]["slug"]}')
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[0]['id'], third_title.id
+        ], f'Проверьте, что `{top_url}` фильтрует по категории.'
+
+        Review.objects.filter(title=third_title).delete()
+        call_command('refresh_leaderboard', stdout=StringIO())
+        response = client.get(top_url)
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[1]['id'], titles[0]['id']
+        ], (
+            'Проверьте, что команда `refresh_leaderboard` пересчитывает '
+            'только произведения, отзывы которых изменились.'
+        )
+        call_command('refresh_leaderboard', '--full', stdout=StringIO())
+        response = client.get(top_url)
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[0]['id'], titles[1]['id']
+        ], (
+            'Проверьте, что команда `refresh_leaderboard --full` '
+            'пересчитывает все произведения.'
+        )
+
+    def test_04_bulk_review_import(self, client, admin_client, user_client,
+                                   moderator_client, moderator, monkeypatch):
+        titles, _, _ = create_titles(admin_client)
+        first_id, second_id = titles[0]['id'], titles[1]['id']
+        create_single_review(user_client, first_id, 'Отзыв', 2)
+        assert self.get_title(client, second_id)['rating'] is None
+
+        import_url = '/api/v1/reviews/import/'
+        data = [
+            {'title': first_id, 'author': 'TestUser', 'text': 'Дубль',
+             'score': 8},
+            {'title': first_id, 'author': 'TestModerator', 'text': 'Отзыв',
+             'score': 6},
+            {'title': second_id, 'author': 'TestUser', 'text': 'Отзыв',
+             'score': 10},
+        ]
+        response = moderator_client.post(
+            import_url, data=data, format='json'
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN, (
+            f'Проверьте, что POST-запрос не-администратора к `{import_url}` '
+            'возвращает ответ со статусом 403.'
+        )
+        response = admin_client.post(import_url, data=data, format='json')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == {'created': 2, 'updated': 0, 'skipped': 1}
+        assert self.get_title(client, first_id)['rating'] == 4
+        assert self.get_title(client, second_id)['rating'] == 10, (
+            f'Проверьте, что `{import_url}` пересчитывает рейтинг '
+            'произведений и сбрасывает их кеш.'
+        )
+
+        response = admin_client.post(
+            f'{import_url}?on_conflict=update',
+            data=[{'title': first_id, 'author': 'TestUser', 'text': 'Новый',
+                   'score': 4}],
+            format='json'
+        )
+        assert response.json() == {'created': 0, 'updated': 1, 'skipped': 0}
+        assert Review.objects.get(
+            title_id=first_id, author__username='TestUser'
+        ).text == 'Новый'
+        assert self.get_title(client, first_id)['rating'] == 5, (
+            f'Проверьте, что `{import_url}?on_conflict=update` обновляет '
+            'существующие отзывы и пересчитывает рейтинг.'
+        )
+        scores = client.get(
+            f'/api/v1/titles/{first_id}/stats/'
+        ).json()['scores']
+        assert (scores['2'], scores['4'], scores['6']) == (0, 1, 1)
+
+        response = admin_client.post(
+            import_url,
+            data=[
+                {'title': 0, 'author': 'TestUser', 'text': 'Отзыв',
+                 'score': 5},
+                {'title': second_id, 'author': 'Nobody', 'text': 'Отзыв',
+                 'score': 5},
+                {'title': second_id, 'author': 'TestAdmin', 'text': 'Отзыв',
+                 'score': 11},
+                {'title': second_id, 'author': 'TestAdmin', 'text': 'Отзыв',
+                 'score': 5},
+                {'title': second_id, 'author': 'TestAdmin', 'text': 'Отзыв',
+                 'score': 5},
+            ],
+            format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        errors = response.json()
+        assert [sorted(error) for error in errors] == [
+            ['title'], ['author'], ['score'], [], ['non_field_errors']
+        ], (
+            f'Проверьте, что `{import_url}` возвращает ошибки по позициям '
+            'отзывов и не принимает повторы в одном запросе.'
+        )
+        assert Review.objects.filter(title_id=second_id).count() == 1
+        response = admin_client.post(
+            f'{import_url}?on_conflict=merge', data=data, format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        for payload in (5, {'title': first_id}):
+            response = admin_client.post(
+                import_url, data=payload, format='json'
+            )
+            assert response.status_code == HTTPStatus.BAD_REQUEST, (
+                f'Проверьте, что `{import_url}` возвращает ответ со статусом '
+                '400, если передан не список отзывов.'
+            )
+
+        find_reviews = ReviewImportListSerializer.find_reviews
+
+        def find_reviews_racing(pairs):
+            # Параллельный запрос добавляет отзыв сразу после проверки
+            reviews = find_reviews(pairs)
+            if not Review.objects.filter(author=moderator).exclude(
+                title_id=first_id
+            ).exists():
+                Review.objects.create(
+                    title_id=second_id, author=moderator, text='Отзыв',
+                    score=1
+                )
+            return reviews
+
+        monkeypatch.setattr(
+            ReviewImportListSerializer, 'find_reviews',
+            staticmethod(find_reviews_racing)
+        )
+        response = admin_client.post(import_url, data=[
+            {'title': second_id, 'author': author, 'text': 'Отзыв',
+             'score': 5}
+            for author in ('TestModerator', 'TestAdmin')
+        ], format='json')
+        assert response.json() == {'created': 1, 'updated': 0, 'skipped': 1}, (
+            f'Проверьте, что `{import_url}` не считает созданными отзывы, '
+            'пропущенные из-за параллельной вставки.'
+        )
+
+    def test_05_title_save_keeps_rating(self, client, admin_client,
+                                        user_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        stale_title = Title.objects.get(pk=title_id)
+        create_single_review(user_client, title_id, 'Отзыв', 9)
+
+        response = admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=title_id),
+            data={'year': 1985}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_title(client, title_id)['rating'] == 9, (
+            'Проверьте, что изменение произведения не сбрасывает его '
+            'рейтинг.'
+        )
+
+        stale_title.description = 'Новое описание'
+        stale_title.save()
+        title = Title.objects.get(pk=title_id)
+        assert (
+            title.rating_sum, title.rating_count, title.rating,
+            title.description
+        ) == (9, 1, 9.0, 'Новое описание'), (
+            'Проверьте, что сохранение произведения, загруженного до '
+            'добавления отзыва, не перезаписывает сумму и количество оценок.'
+        )
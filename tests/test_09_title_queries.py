@@ -0,0 +1,713 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Q
+from django.test.utils import CaptureQueriesContext
+
+from api.autocomplete import title_names
+from api.cache import TITLE_NAMES, bump_generation, get_cache, get_generation
+from api.filters import TitleFilter
+from api.pagination import keyset_segments
+from api.serializers import TitleReadSerializer
+from reviews.models import Category, Genre, Title
+
+
+TITLES_COUNT = 25
+
+
+@pytest.fixture
+def many_titles():
+    category = Category.objects.create(name='Фильм', slug='movie')
+    genres = (
+        Genre.objects.create(name='Драма', slug='drama'),
+        Genre.objects.create(name='Комедия', slug='comedy'),
+    )
+    titles = Title.objects.bulk_create(
+        Title(name=f'Произведение {idx:02}', year=2000, category=category)
+        for idx in range(TITLES_COUNT)
+    )
+    for title in Title.objects.all():
+        title.genre.set(genres)
+    return titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test09TitleQueries:
+
+    TITLES_URL = '/api/v1/titles/'
+    TITLES_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    # Валидаторы условного GET, COUNT для пагинации, страница произведений
+    # с категориями и жанры
+    LIST_QUERIES_BUDGET = 4
+    DETAIL_QUERIES_BUDGET = 3
+
+    @staticmethod
+    def explain(params, ordering=('name', 'id'), segment=Q()):
+        """План SQLite для запроса списка с фильтрами и сортировкой."""
+        sql, sql_params = TitleFilter(
+            params, queryset=Title.objects.all()
+        ).qs.filter(segment).order_by(*ordering).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', sql_params)
+            return ' '.join(str(row) for row in cursor.fetchall())
+
+    def test_01_title_list_query_budget(self, client, many_titles,
+                                        django_assert_max_num_queries):
+        with django_assert_max_num_queries(self.LIST_QUERIES_BUDGET):
+            response = client.get(self.TITLES_URL)
+        assert len(response.json()['results']) > 1
+        for title in response.json()['results']:
+            assert title['category']['slug'] == 'movie'
+            assert len(title['genre']) == 2
+
+    def test_02_title_detail_query_budget(self, client, many_titles,
+                                          django_assert_max_num_queries):
+        title = Title.objects.first()
+        with django_assert_max_num_queries(self.DETAIL_QUERIES_BUDGET):
+            client.get(
+                self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+            )
+
+    def test_03_title_cursor_pagination(self, client, many_titles):
+        response = client.get(f'{self.TITLES_URL}?pagination=cursor')
+        data = response.json()
+        assert 'count' not in data and data['previous'] is None, (
+            f'Проверьте, что курсорная пагинация `{self.TITLES_URL}` не '
+            'считает общее количество объектов.'
+        )
+        names = [title['name'] for title in data['results']]
+        while data['next']:
+            data = client.get(data['next']).json()
+            names += [title['name'] for title in data['results']]
+        assert names == sorted(
+            Title.objects.values_list('name', flat=True)
+        ), (
+            f'Проверьте, что курсорная пагинация `{self.TITLES_URL}` '
+            'возвращает все произведения без повторов в порядке сортировки.'
+        )
+        previous = client.get(data['previous']).json()
+        assert [title['name'] for title in previous['results']] == (
+            names[-len(data['results']) - 20:-len(data['results'])]
+        ), (
+            f'Проверьте, что ссылка `previous` курсорной пагинации '
+            f'`{self.TITLES_URL}` возвращает предыдущую страницу.'
+        )
+
+    def test_04_title_cursor_pagination_filters(self, client, many_titles):
+        Title.objects.filter(pk=Title.objects.last().pk).update(year=1990)
+        response = client.get(
+            f'{self.TITLES_URL}?pagination=cursor&year=1990'
+        )
+        assert len(response.json()['results']) == 1, (
+            f'Проверьте, что курсорная пагинация `{self.TITLES_URL}` '
+            'учитывает фильтры.'
+        )
+        response = client.get(f'{self.TITLES_URL}?cursor=broken')
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что при некорректном курсоре возвращается ответ со '
+            'статусом 404.'
+        )
+
+    def test_05_title_search(self, client, many_titles):
+        Title.objects.create(
+            name='Мастер и Маргарита',
+            year=1967,
+            description='Роман о дьяволе, посетившем Москву.',
+            category=Category.objects.first()
+        )
+        title = Title.objects.create(
+            name='Москва слезам не верит',
+            year=1979,
+            category=Category.objects.first()
+        )
+        response = client.get(f'{self.TITLES_URL}?search=москв')
+        names = [title['name'] for title in response.json()['results']]
+        assert names == ['Москва слезам не верит', 'Мастер и Маргарита'], (
+            f'Проверьте, что параметр `search` эндпоинта `{self.TITLES_URL}` '
+            'ищет по названию и описанию и сортирует по релевантности.'
+        )
+        title.name = 'Служебный роман'
+        title.save()
+        response = client.get(f'{self.TITLES_URL}?search=москв')
+        assert response.json()['count'] == 1, (
+            'Проверьте, что поисковый индекс обновляется при изменении '
+            'произведения.'
+        )
+        response = client.get(f'{self.TITLES_URL}?search=" OR *')
+        assert response.status_code == HTTPStatus.OK
+
+    def test_06_title_ordering(self, client, many_titles):
+        Title.objects.filter(
+            pk__in=Title.objects.order_by('-name').values('pk')[:3]
+        ).update(rating=7.5)
+        response = client.get(f'{self.TITLES_URL}?ordering=-rating')
+        names = [title['name'] for title in response.json()['results']]
+        expected = list(
+            Title.objects.order_by('-rating', '-id').values_list(
+                'name', flat=True
+            )[:len(names)]
+        )
+        assert names == expected, (
+            f'Проверьте, что эндпоинт `{self.TITLES_URL}` поддерживает '
+            'сортировку по рейтингу.'
+        )
+        response = client.get(f'{self.TITLES_URL}?ordering=description')
+        names = [title['name'] for title in response.json()['results']]
+        assert names == sorted(names), (
+            f'Проверьте, что эндпоинт `{self.TITLES_URL}` сортирует только '
+            'по разрешённым полям.'
+        )
+
+        Title.objects.filter(
+            pk__in=Title.objects.order_by('name').values('pk')[:4]
+        ).update(rating=3)
+        Title.objects.filter(pk=Title.objects.order_by('id').last().pk).update(
+            year=1990
+        )
+        for ordering, expected in (
+            ('-rating', Title.objects.order_by(
+                F('rating').desc(nulls_last=True), '-id'
+            )),
+            ('rating', Title.objects.order_by(
+                F('rating').asc(nulls_first=True), 'id'
+            )),
+            ('-year', Title.objects.order_by('-year', '-id')),
+        ):
+            url = f'{self.TITLES_URL}?ordering={ordering}&pagination=cursor'
+            data = client.get(url).json()
+            ids = [title['id'] for title in data['results']]
+            while data['next']:
+                data = client.get(data['next']).json()
+                ids += [title['id'] for title in data['results']]
+            assert ids == list(expected.values_list('id', flat=True)), (
+                f'Проверьте, что курсорная пагинация `{url}` сохраняет '
+                'сортировку из параметра `ordering`.'
+            )
+            previous = client.get(data['previous']).json()
+            assert [title['id'] for title in previous['results']] == (
+                ids[-len(data['results']) - 20:-len(data['results'])]
+            )
+        response = client.get(
+            f'{self.TITLES_URL}?search=Произведение&pagination=cursor'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что поиск по релевантности с курсорной пагинацией '
+            'возвращает ответ со статусом 400.'
+        )
+
+    def test_07_title_bulk_create(self, admin_client, many_titles,
+                                  django_assert_max_num_queries):
+        payload = [
+            {
+                'name': f'Пакетное произведение {idx}',
+                'year': 1990 + idx % 10,
+                'genre': ['drama', 'comedy'],
+                'category': 'movie'
+            }
+            for idx in range(300)
+        ]
+        titles_count = Title.objects.count()
+        with django_assert_max_num_queries(15):
+            response = admin_client.post(
+                self.TITLES_URL, data=payload, format='json'
+            )
+        assert response.status_code == HTTPStatus.CREATED, (
+            f'Проверьте, что POST-запрос администратора к `{self.TITLES_URL}` '
+            'со списком произведений возвращает ответ со статусом 201.'
+        )
+        data = response.json()
+        assert [title['name'] for title in data] == [
+            item['name'] for item in payload
+        ]
+        assert Title.objects.count() == titles_count + len(payload)
+        created = Title.objects.get(pk=data[-1]['id'])
+        assert created.name == payload[-1]['name']
+        assert set(created.genre.values_list('slug', flat=True)) == {
+            'drama', 'comedy'
+        }, 'Проверьте, что при пакетном создании сохраняются жанры.'
+
+        payload = [
+            {'name': 'Верное', 'year': 2000, 'genre': ['drama'],
+             'category': 'movie'},
+            {'name': 'Неверное', 'year': 2000, 'genre': ['unknown'],
+             'category': 'book'},
+        ]
+        response = admin_client.post(
+            self.TITLES_URL, data=payload, format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        errors = response.json()
+        assert errors[0] == {} and set(errors[1]) == {'genre', 'category'}, (
+            'Проверьте, что при пакетном создании ошибки возвращаются '
+            'для каждого произведения.'
+        )
+        assert not Title.objects.filter(name='Верное').exists()
+
+        response = admin_client.post(self.TITLES_URL, data=[
+            {'name': 'Повтор жанра', 'year': 2000,
+             'genre': ['drama', 'drama'], 'category': 'movie'},
+        ], format='json')
+        assert response.status_code == HTTPStatus.CREATED, (
+            'Проверьте, что повторы жанра в пакетном создании не приводят '
+            'к ошибке.'
+        )
+        assert [genre['slug'] for genre in response.json()[0]['genre']] == [
+            'drama'
+        ]
+
+    def test_08_title_conditional_get(self, client, many_titles):
+        response = client.get(self.TITLES_URL)
+        etag = response['ETag']
+        assert etag, (
+            f'Проверьте, что ответ `{self.TITLES_URL}` содержит заголовок '
+            '`ETag`.'
+        )
+        assert not response.has_header('Last-Modified'), (
+            'Проверьте, что список не отправляет `Last-Modified`: удаление '
+            'не меняет наибольшую дату изменения.'
+        )
+        response = client.get(self.TITLES_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+            f'Проверьте, что `{self.TITLES_URL}` возвращает ответ со статусом '
+            '304, если данные не изменились.'
+        )
+
+        oldest = Title.objects.order_by('modified', 'id').first()
+        etag = client.get(self.TITLES_URL)['ETag']
+        Title.objects.filter(pk=oldest.pk).delete()
+        response = client.get(self.TITLES_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что удаление давно изменённого произведения меняет '
+            '`ETag` списка.'
+        )
+        etag = response['ETag']
+
+        Genre.objects.get(slug='comedy').delete()
+        response = client.get(self.TITLES_URL, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что удаление жанра меняет `ETag` списка произведений.'
+        )
+        assert len(response.json()['results'][0]['genre']) == 1
+
+        title = Title.objects.first()
+        detail_url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        etag = client.get(detail_url)['ETag']
+        title.description = 'Новое описание'
+        title.save()
+        response = client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            'Проверьте, что изменение произведения меняет его `ETag`.'
+        )
+        genre = Genre.objects.get(slug='drama')
+        for change in (
+            lambda: title.genre.remove(genre),
+            lambda: genre.titles.add(title),
+            lambda: genre.titles.clear(),
+        ):
+            etag = client.get(detail_url)['ETag']
+            list_etag = client.get(self.TITLES_URL)['ETag']
+            change()
+            response = client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.OK, (
+                'Проверьте, что изменение жанров произведения меняет его '
+                '`ETag`.'
+            )
+            response = client.get(
+                self.TITLES_URL, HTTP_IF_NONE_MATCH=list_etag
+            )
+            assert response.status_code == HTTPStatus.OK
+        response = client.get(
+            self.TITLES_DETAIL_URL_TEMPLATE.format(title_id='abc')
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что запрос произведения с нечисловым id возвращает '
+            'ответ со статусом 404.'
+        )
+
+    def test_09_title_sparse_fields(self, client, many_titles,
+                                    django_assert_max_num_queries):
+        with django_assert_max_num_queries(self.LIST_QUERIES_BUDGET - 1):
+            response = client.get(f'{self.TITLES_URL}?fields=id,name,rating')
+        for title in response.json()['results']:
+            assert set(title) == {'id', 'name', 'rating'}, (
+                f'Проверьте, что `{self.TITLES_URL}` возвращает только поля, '
+                'перечисленные в параметре `fields`.'
+            )
+        title = Title.objects.first()
+        response = client.get(
+            self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+            + '?fields=category,year'
+        )
+        assert response.json() == {
+            'category': {'name': 'Фильм', 'slug': 'movie'},
+            'year': title.year
+        }
+
+    def test_10_title_fast_list_matches_serializer(self, client,
+                                                   many_titles):
+        Title.objects.filter(pk=Title.objects.first().pk).update(rating=7.5)
+        response = client.get(f'{self.TITLES_URL}?page=2')
+        titles = Title.objects.filter(
+            pk__in=[title['id'] for title in response.json()['results']]
+        ).order_by('name')
+        assert response.json()['results'] == TitleReadSerializer(
+            titles, many=True
+        ).data, (
+            f'Проверьте, что `{self.TITLES_URL}` возвращает произведения в '
+            'том же формате, что и `TitleReadSerializer`.'
+        )
+        response = client.get(self.TITLES_URL)
+        assert response.json()['results'][0]['rating'] == 7
+
+    def test_11_title_response_cache(self, client, user_client, many_titles,
+                                     django_assert_num_queries,
+                                     monkeypatch, tmp_path):
+        url = f'{self.TITLES_URL}?category=movie&genre=drama&page=2'
+        data = client.get(url).json()
+        with django_assert_num_queries(0):
+            response = client.get(
+                f'{self.TITLES_URL}?page=2&genre=drama&category=movie'
+            )
+        assert response.json() == data, (
+            f'Проверьте, что повторный запрос к `{self.TITLES_URL}` с теми же '
+            'параметрами отдаётся из кеша без обращения к базе.'
+        )
+        with django_assert_num_queries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        genre = Genre.objects.get(slug='drama')
+        genre.name = 'Драма и трагедия'
+        genre.save()
+        names = {
+            genre['name']
+            for title in client.get(url).json()['results']
+            for genre in title['genre']
+        }
+        assert 'Драма и трагедия' in names, (
+            'Проверьте, что изменение жанра сбрасывает кеш списка '
+            'произведений.'
+        )
+
+        title = Title.objects.first()
+        detail_url = self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=title.id)
+        assert client.get(detail_url).json()['rating'] is None
+        with django_assert_num_queries(0):
+            client.get(detail_url)
+        user_client.post(
+            f'{detail_url}reviews/', data={'text': 'Отзыв', 'score': 7}
+        )
+        assert client.get(detail_url).json()['rating'] == 7, (
+            'Проверьте, что новый отзыв сбрасывает кеш карточки произведения.'
+        )
+        title.genre.remove(genre)
+        assert len(client.get(detail_url).json()['genre']) == 1, (
+            'Проверьте, что изменение жанров произведения сбрасывает кеш.'
+        )
+        data_dir = tmp_path / 'static' / 'data'
+        data_dir.mkdir(parents=True)
+        (data_dir / 'genre_title.csv').write_text(
+            f'id,title_id,genre_id\n1,{title.id},{genre.id}\n'
+        )
+        monkeypatch.chdir(tmp_path)
+        call_command('load_csv', '--all', stdout=StringIO(), stderr=StringIO())
+        assert len(client.get(detail_url).json()['genre']) == 2, (
+            'Проверьте, что загрузка связей жанров из CSV сбрасывает кеш '
+            'произведения.'
+        )
+
+        # Поколения разных произведений совпадают при одинаковом времени
+        monkeypatch.setattr('api.cache.time.time_ns', lambda: 1)
+        get_cache().clear()
+        first, second = Title.objects.exclude(pk=title.pk)[:2]
+        for other in (first, second):
+            response = client.get(
+                self.TITLES_DETAIL_URL_TEMPLATE.format(title_id=other.id)
+            )
+            assert response.json()['id'] == other.id, (
+                'Проверьте, что кеш карточки произведения не отдаёт ответ '
+                'другого произведения.'
+            )
+
+    def test_12_title_response_cache_file_based(self, client, many_titles,
+                                                tmp_path, settings,
+                                                django_assert_num_queries):
+        settings.CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': str(tmp_path),
+            }
+        }
+        client.get(self.TITLES_URL)
+        with django_assert_num_queries(0):
+            client.get(self.TITLES_URL)
+        title = Title.objects.first()
+        title.name = 'Аааа'
+        title.save()
+        response = client.get(self.TITLES_URL)
+        assert response.json()['results'][0]['name'] == 'Аааа', (
+            'Проверьте, что кеш на файлах сбрасывается при изменении '
+            'произведения.'
+        )
+
+    def test_13_title_multi_value_filters(self, client, many_titles):
+        book = Category.objects.create(name='Книга', slug='book')
+        poetry = Genre.objects.create(name='Поэзия', slug='poetry')
+        poem = Title.objects.create(name='Поэма', year=1833, category=book)
+        poem.genre.set([poetry, Genre.objects.get(slug='drama')])
+        Title.objects.create(
+            name='Без жанра', year=1900, category=Category.objects.create(
+                name='Музыка', slug='music'
+            )
+        )
+
+        response = client.get(f'{self.TITLES_URL}?genre=comedy,poetry')
+        data = response.json()
+        ids = [title['id'] for title in data['results']]
+        assert data['count'] == TITLES_COUNT + 1 and len(ids) == len(
+            set(ids)
+        ), (
+            f'Проверьте, что фильтр `genre` эндпоинта `{self.TITLES_URL}` '
+            'принимает несколько жанров и не дублирует произведения.'
+        )
+        response = client.get(f'{self.TITLES_URL}?genre_all=drama,poetry')
+        assert [title['id'] for title in response.json()['results']] == [
+            poem.id
+        ], (
+            f'Проверьте, что фильтр `genre_all` эндпоинта `{self.TITLES_URL}` '
+            'возвращает произведения со всеми указанными жанрами.'
+        )
+        response = client.get(f'{self.TITLES_URL}?category=book,music')
+        assert response.json()['count'] == 2, (
+            f'Проверьте, что фильтр `category` эндпоинта `{self.TITLES_URL}` '
+            'принимает несколько категорий.'
+        )
+        response = client.get(f'{self.TITLES_URL}?genre=unknown')
+        assert response.json()['count'] == 0
+
+        plan = self.explain({'genre': 'drama,comedy'})
+        assert 'title_genre_genre_title_idx' in plan, (
+            'Проверьте, что фильтр по жанрам использует индекс '
+            '(genre_id, title_id) таблицы связей.'
+        )
+
+    def test_14_title_year_range(self, client, many_titles):
+        for year, title in zip(range(1985, 2005), Title.objects.all()):
+            title.year = year
+            title.save()
+        response = client.get(
+            f'{self.TITLES_URL}?category=movie&year_min=1990&year_max=1999'
+        )
+        years = [title['year'] for title in response.json()['results']]
+        assert sorted(years) == list(range(1990, 2000)), (
+            f'Проверьте, что фильтры `year_min` и `year_max` эндпоинта '
+            f'`{self.TITLES_URL}` отбирают произведения по диапазону лет '
+            'включительно.'
+        )
+
+        plan = self.explain(
+            {'category': 'movie', 'year_min': 1990, 'year_max': 1999}
+        )
+        assert 'title_category_year_idx' in plan, (
+            'Проверьте, что фильтр по категории и диапазону лет использует '
+            'индекс (category_id, year).'
+        )
+        plan = self.explain({'category': 'movie'})
+        assert 'title_category_name_id_idx' in plan and (
+            'TEMP B-TREE' not in plan
+        ), (
+            'Проверьте, что фильтр по категории с сортировкой по названию '
+            'использует индекс (category_id, name, id) без сортировки.'
+        )
+
+    def test_15_title_autocomplete(self, client, admin_client, many_titles,
+                                   django_assert_num_queries, monkeypatch):
+        url = f'{self.TITLES_URL}autocomplete/'
+        client.get(f'{url}?q=про')
+        with django_assert_num_queries(0):
+            response = client.get(f'{url}?q=прОИЗВЕДЕНИЕ 1&limit=3')
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{url}` возвращает ответ со '
+            'статусом 200.'
+        )
+        assert [title['name'] for title in response.json()] == [
+            'Произведение 10', 'Произведение 11', 'Произведение 12'
+        ], (
+            f'Проверьте, что `{url}` возвращает первые по алфавиту '
+            'произведения, название которых начинается с `q`, без учёта '
+            'регистра.'
+        )
+
+        title = Title.objects.create(
+            name='Москва слезам не верит', year=1979,
+            category=Category.objects.first()
+        )
+        with django_assert_num_queries(0):
+            response = client.get(f'{url}?q=моск')
+        assert response.json() == [
+            {'id': title.id, 'name': 'Москва слезам не верит'}
+        ], f'Проверьте, что `{url}` учитывает новые произведения.'
+
+        # Процесс, который ещё не читал индекс, меняет год произведения
+        monkeypatch.setattr(title_names, 'generation', None)
+        generation = get_generation(TITLE_NAMES)
+        loaded_title = Title.objects.get(pk=title.id)
+        loaded_title.year = 1980
+        loaded_title.save()
+        assert get_generation(TITLE_NAMES) == generation, (
+            'Проверьте, что изменение произведения без изменения названия '
+            'не сбрасывает индекс названий.'
+        )
+        title.name = 'Служебный роман'
+        title.save()
+        assert client.get(f'{url}?q=моск').json() == []
+        title.delete()
+        assert client.get(f'{url}?q=служ').json() == [], (
+            f'Проверьте, что `{url}` учитывает изменение и удаление '
+            'произведений.'
+        )
+
+        admin_client.post(self.TITLES_URL, data=[{
+            'name': 'Пакетное', 'year': 2000, 'genre': ['drama'],
+            'category': 'movie'
+        }], format='json')
+        assert [
+            title['name'] for title in client.get(f'{url}?q=пак').json()
+        ] == ['Пакетное'], (
+            f'Проверьте, что `{url}` учитывает пакетно созданные '
+            'произведения.'
+        )
+        assert client.get(url).json() == []
+
+        def bump_concurrently(*namespaces):
+            # Другой процесс увеличивает поколение сразу после этого
+            bump_generation(*namespaces)
+            return bump_generation(*namespaces) - 1
+
+        # Изменение другого процесса, о котором индекс узнаёт по поколению
+        Title.objects.filter(name='Пакетное').update(name='Кин-дза-дза')
+        monkeypatch.setattr(
+            'api.autocomplete.bump_generation', bump_concurrently
+        )
+        Title.objects.create(
+            name='Москва', year=1979, category=Category.objects.first()
+        )
+        assert [
+            title['name'] for title in client.get(f'{url}?q=кин').json()
+        ] == ['Кин-дза-дза'], (
+            f'Проверьте, что `{url}` перечитывает названия, если поколение '
+            'увеличил другой процесс.'
+        )
+
+    def test_16_catalog_cache(self, client, admin_client, many_titles,
+                              django_assert_num_queries):
+        url = '/api/v1/genres/'
+        client.get(url)
+        with django_assert_num_queries(0):
+            response = client.get(url)
+        assert [genre['slug'] for genre in response.json()['results']] == [
+            'drama', 'comedy'
+        ], (
+            f'Проверьте, что `{url}` отдаёт жанры из кеша без обращения к '
+            'базе.'
+        )
+        admin_client.post(url, data={'name': 'Аниме', 'slug': 'anime'})
+        assert client.get(url).json()['count'] == 3, (
+            f'Проверьте, что создание жанра сбрасывает кеш `{url}`.'
+        )
+        admin_client.delete(f'{url}anime/')
+        assert client.get(url).json()['count'] == 2, (
+            f'Проверьте, что удаление жанра сбрасывает кеш `{url}`.'
+        )
+        assert client.get(f'{url}?search=Ком').json()['count'] == 1
+
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post(self.TITLES_URL, data={
+                'name': 'Новое', 'year': 2000, 'genre': ['drama', 'comedy'],
+                'category': 'movie'
+            })
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.json()['category'] == {
+            'name': 'Фильм', 'slug': 'movie'
+        }
+        assert not [
+            query for query in context.captured_queries
+            if 'WHERE "reviews_genre"."slug"' in query['sql']
+            or 'WHERE "reviews_category"."slug"' in query['sql']
+        ], (
+            'Проверьте, что при создании произведения категория и жанры '
+            'ищутся по slug в кеше справочников.'
+        )
+
+        # Запись другого процесса не меняет поколение в локальном кеше
+        Genre.objects.bulk_create([Genre(name='Вестерн', slug='western')])
+        response = admin_client.post(self.TITLES_URL, data={
+            'name': 'Ещё новое', 'year': 2000, 'genre': ['western'],
+            'category': 'movie'
+        })
+        assert response.status_code == HTTPStatus.CREATED, (
+            'Проверьте, что slug, которого нет в кеше справочников, '
+            'проверяется в базе.'
+        )
+        response = admin_client.post(self.TITLES_URL, data={
+            'name': 'Ещё новое', 'year': 2000, 'genre': ['missing'],
+            'category': 'movie'
+        })
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = admin_client.post(self.TITLES_URL, data={
+            'name': 'Новое', 'year': 2000, 'genre': ['anime'],
+            'category': 'movie'
+        })
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_17_catalog_titles_count(self, client, many_titles,
+                                     django_assert_num_queries):
+        Genre.objects.create(name='Аниме', slug='anime')
+        Category.objects.create(name='Книга', slug='book')
+        Title.objects.first().genre.remove(Genre.objects.get(slug='drama'))
+        for url, expected in (
+            ('/api/v1/genres/', {'anime': 0, 'comedy': TITLES_COUNT,
+                                 'drama': TITLES_COUNT - 1}),
+            ('/api/v1/categories/', {'book': 0, 'movie': TITLES_COUNT}),
+        ):
+            assert 'titles_count' not in client.get(url).json()['results'][0]
+            with django_assert_num_queries(1):
+                response = client.get(f'{url}?fields=slug,titles_count')
+            assert {
+                item['slug']: item['titles_count']
+                for item in response.json()['results']
+            } == expected, (
+                f'Проверьте, что `{url}?fields=slug,titles_count` возвращает '
+                'количество произведений одним запросом.'
+            )
+        response = client.get(
+            '/api/v1/genres/?search=Драма&fields=name,titles_count'
+        )
+        assert response.json()['results'] == [
+            {'name': 'Драма', 'titles_count': TITLES_COUNT - 1}
+        ]
+        for url in ('/api/v1/genres/', '/api/v1/categories/'):
+            response = client.get(f'{url}?fields=name')
+            assert list(response.json()['results'][0]) == ['name'], (
+                f'Проверьте, что `{url}` учитывает `?fields=` и без поля '
+                '`titles_count`.'
+            )
+
+    @pytest.mark.parametrize('ordering', [('-rating', '-id'), ('rating', 'id')])
+    @pytest.mark.parametrize('position', [[5.0, 3], [None, 3]])
+    def test_18_title_rating_cursor_plan(self, many_titles, ordering,
+                                         position):
+        for segment in keyset_segments(ordering, position, nullable=True):
+            plan = self.explain({}, ordering, segment)
+            assert 'title_rating_id_idx' in plan and 'SEARCH' in plan and (
+                'TEMP B-TREE' not in plan
+            ), (
+                'Проверьте, что страница после курсора по `rating` читает '
+                'диапазон индекса (rating, id) отдельно для значений и для '
+                'NULL, без полного просмотра и сортировки.'
+            )
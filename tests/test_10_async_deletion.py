@@ -0,0 +1,169 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Category, Comment, Review, Title
+from tests.utils import (
+    create_single_comment, create_single_review, create_titles
+)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test10AsyncDeletion:
+
+    TITLES_URL = '/api/v1/titles/'
+    CATEGORY_DETAIL_URL_TEMPLATE = '/api/v1/categories/{slug}/?async=true'
+
+    def purge(self):
+        stdout = StringIO()
+        call_command('purge_deleted', '--batch-size', '1', stdout=stdout)
+        return stdout.getvalue()
+
+    def test_01_category_async_deletion(self, client, admin_client,
+                                        user_client, moderator_client):
+        titles, categories, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        for author_client in (user_client, moderator_client):
+            response = create_single_review(
+                author_client, title_id, 'Отзыв', 5
+            )
+        create_single_comment(
+            user_client, title_id, response.json()['id'], 'Комментарий'
+        )
+
+        url = self.CATEGORY_DETAIL_URL_TEMPLATE.format(
+            slug=categories[0]['slug']
+        )
+        assert client.delete(url).status_code == HTTPStatus.UNAUTHORIZED
+        response = admin_client.delete(url)
+        assert response.status_code == HTTPStatus.ACCEPTED, (
+            'Проверьте, что DELETE-запрос администратора к '
+            '`/api/v1/categories/{slug}/?async=true` возвращает ответ со '
+            'статусом 202.'
+        )
+        slugs = [
+            category['slug']
+            for category in client.get('/api/v1/categories/').json()[
+                'results'
+            ]
+        ]
+        assert categories[0]['slug'] not in slugs, (
+            'Проверьте, что категория, ожидающая удаления, сразу скрыта.'
+        )
+        assert client.get(
+            f'{self.TITLES_URL}{title_id}/'
+        ).status_code == HTTPStatus.NOT_FOUND, (
+            'Проверьте, что произведения категории, ожидающей удаления, '
+            'сразу скрыты.'
+        )
+        assert [
+            title['id'] for title in client.get(self.TITLES_URL).json()[
+                'results'
+            ]
+        ] == [titles[1]['id']]
+        assert Review.objects.count() == 2
+
+        output = self.purge()
+        assert 'удалено 2' in output, (
+            'Проверьте, что команда `purge_deleted` сообщает о ходе удаления.'
+        )
+        assert not Category.all_objects.filter(
+            slug=categories[0]['slug']
+        ).exists()
+        assert not Title.all_objects.filter(pk=title_id).exists()
+        assert not Review.objects.exists() and not Comment.objects.exists(), (
+            'Проверьте, что команда `purge_deleted` удаляет зависимые '
+            'объекты.'
+        )
+
+    def test_02_title_and_user_async_deletion(self, client, admin_client,
+                                              user_client, user):
+        titles, _, _ = create_titles(admin_client)
+        for title in titles:
+            create_single_review(user_client, title['id'], 'Отзыв', 3)
+        stale_title = Title.objects.get(pk=titles[0]['id'])
+        stale_user = type(user).objects.get(pk=user.pk)
+
+        response = admin_client.delete(
+            f'{self.TITLES_URL}{titles[0]["id"]}/?async=true'
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert client.get(self.TITLES_URL).json()['count'] == 1
+
+        response = admin_client.delete(
+            f'/api/v1/users/{user.username}/?async=1'
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED, (
+            'Проверьте, что DELETE-запрос администратора к '
+            '`/api/v1/users/{username}/?async=1` возвращает ответ со '
+            'статусом 202.'
+        )
+        response = admin_client.get(f'/api/v1/users/{user.username}/')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert user_client.get('/api/v1/users/me/').status_code == (
+            HTTPStatus.UNAUTHORIZED
+        ), 'Проверьте, что пользователь, ожидающий удаления, не может войти.'
+
+        stale_title.description = 'Параллельное изменение'
+        stale_title.save()
+        stale_user.bio = 'Параллельное изменение'
+        stale_user.save()
+        assert client.get(self.TITLES_URL).json()['count'] == 1, (
+            'Проверьте, что сохранение объекта, загруженного до удаления, '
+            'не делает его снова видимым.'
+        )
+        assert not type(user).objects.filter(pk=user.pk).exists()
+
+        self.purge()
+        assert not Title.all_objects.filter(pk=titles[0]['id']).exists()
+        assert not Review.objects.exists()
+        assert client.get(
+            f'{self.TITLES_URL}{titles[1]["id"]}/'
+        ).json()['rating'] is None, (
+            'Проверьте, что после удаления отзывов пользователя рейтинг '
+            'произведений пересчитывается.'
+        )
+        response = admin_client.delete(f'{self.TITLES_URL}{titles[1]["id"]}/')
+        assert response.status_code == HTTPStatus.NO_CONTENT
+
+    def test_03_hidden_objects_keep_unique_values(self, client, admin_client,
+                                                  user):
+        _, categories, _ = create_titles(admin_client)
+        category = categories[0]
+        admin_client.delete(
+            self.CATEGORY_DETAIL_URL_TEMPLATE.format(slug=category['slug'])
+        )
+        response = admin_client.post('/api/v1/categories/', data=category)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что slug категории, ожидающей удаления, нельзя '
+            'занять до её удаления.'
+        )
+        assert 'slug' in response.json()
+
+        admin_client.delete(f'/api/v1/users/{user.username}/?async=true')
+        response = admin_client.post('/api/v1/users/', data={
+            'username': user.username, 'email': 'new@yamdb.fake'
+        })
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что имя пользователя, ожидающего удаления, нельзя '
+            'занять до его удаления.'
+        )
+        assert 'username' in response.json()
+
+        signup_url = '/api/v1/auth/signup/'
+        for data, field in (
+            ({'username': user.username, 'email': user.email}, 'username'),
+            ({'username': 'NewUser', 'email': user.email}, 'email'),
+        ):
+            response = client.post(signup_url, data=data)
+            assert response.status_code == HTTPStatus.BAD_REQUEST, (
+                f'Проверьте, что `{signup_url}` возвращает ответ со статусом '
+                '400 для данных пользователя, ожидающего удаления.'
+            )
+            assert field in response.json()
+        response = client.post('/api/v1/auth/token/', data={
+            'username': user.username, 'confirmation_code': '000000'
+        })
+        assert response.status_code == HTTPStatus.NOT_FOUND
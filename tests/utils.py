@@ -1,3 +1,4 @@
+import json
 from http import HTTPStatus
 
 
@@ -305,3 +306,25 @@ def check_fields(obj_type, url_pattern, obj, expected_data, detail=False):
         f'данные {obj_types[obj_type]}{results_in_msg}. Поле `id` не '
         'найдено или не является целым числом.'
     )
+
+
+def create_authors(django_user_model, count):
+    return [
+        django_user_model.objects.create_user(
+            username=f'author{idx}', email=f'author{idx}@yamdb.fake'
+        )
+        for idx in range(count)
+    ]
+
+
+def read_export(client, url):
+    response = client.get(url)
+    assert response.status_code == HTTPStatus.OK
+    assert response.streaming, (
+        f'Проверьте, что `{url}` отдаёт выгрузку потоком.'
+    )
+    assert response['Content-Type'] == 'application/x-ndjson'
+    return [
+        json.loads(line)
+        for line in b''.join(response.streaming_content).splitlines()
+    ]